@@ -1,5 +1,12 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
 import pygame
+import argparse
+import json
+import multiprocessing as mp
+import queue
 import random
+import time
 import numpy as np
 from pygame.locals import *
 
@@ -14,6 +21,13 @@ FLAP_STRENGTH = -5
 PIPE_WIDTH = 50
 PIPE_GAP = 150
 PIPE_FREQUENCY = 1500  # milliseconds
+TICKS_PER_SECOND = 60
+PIPE_INTERVAL = PIPE_FREQUENCY * TICKS_PER_SECOND // 1000  # ticks
+BIRD_X = 100
+
+# Network layout (5 inputs, 8 hidden, 1 output) as slices of a flat genome.
+BRAIN_LAYOUT = (("weights1", (5, 8)), ("bias1", (1, 8)), ("weights2", (8, 1)), ("bias2", (1, 1)))
+GENOME_SIZE = sum(rows * cols for _, (rows, cols) in BRAIN_LAYOUT)
 FONT = pygame.font.SysFont('Arial', 20)
 
 # Colors
@@ -25,57 +39,92 @@ BLUE = (0, 0, 255)
 SKY_BLUE = (135, 206, 235)
 YELLOW = (255, 255, 0)
 
-class Bird:
-    def __init__(self, x, y, brain=None):
+def make_pipe_sequence(rng, count=50):
+    """(x, top height) of count pipes, drawn from the random.Random rng."""
+    sequence = []
+    x = SCREEN_WIDTH
+    for _ in range(count):
+        top_height = rng.randint(100, SCREEN_HEIGHT - PIPE_GAP - 100)
+        sequence.append((x, top_height))
+        x += PIPE_FREQUENCY // 2
+    return sequence
+
+class Flock:
+    """State of every bird as parallel arrays, one element per bird.
+    
+    All birds fly at the same x, so only their height, speed and
+    bookkeeping differ. decision holds each bird's last network output
+    for the brain overlay, NaN until it has made one.
+    """
+    
+    def __init__(self, size, x=BIRD_X, radius=15):
         self.x = x
-        self.y = y
-        self.velocity = 0
-        self.radius = 15
-        self.alive = True
-        self.fitness = 0
-        self.score = 0
-        self.pipes_passed = 0
-        
-        # Neural network (5 inputs, 8 hidden, 1 output)
-        if brain is None:
-            self.brain = NeuralNetwork(5, 8, 1)
-        else:
-            self.brain = brain.copy()
-            self.brain.mutate(0.1)
+        self.radius = radius
+        self.y = np.empty(size)
+        self.velocity = np.empty(size)
+        self.alive = np.empty(size, dtype=bool)
+        self.score = np.empty(size, dtype=np.int64)
+        self.pipes_passed = np.empty(size, dtype=np.int64)
+        self.decision = np.empty(size)
+        self.respawn()
     
-    def flap(self):
-        self.velocity = FLAP_STRENGTH
+    def __len__(self):
+        return len(self.y)
     
-    def update(self):
-        self.velocity += GRAVITY
-        self.y += self.velocity
-        
-        if self.y >= SCREEN_HEIGHT - self.radius or self.y <= self.radius:
-            self.alive = False
+    def respawn(self, y=SCREEN_HEIGHT // 2):
+        self.y[:] = y
+        self.velocity[:] = 0
+        self.alive[:] = True
+        self.score[:] = 0
+        self.pipes_passed[:] = 0
+        self.decision[:] = np.nan
     
-    def think(self, pipes):
-        if not self.alive:
-            return
-            
-        next_pipe = None
-        for pipe in pipes:
-            if pipe.x + PIPE_WIDTH > self.x - 20:
-                next_pipe = pipe
-                break
-        
-        if next_pipe:
-            inputs = np.array([
-                self.y / SCREEN_HEIGHT,
-                (self.velocity + 10) / 20,
-                next_pipe.top_height / SCREEN_HEIGHT,
-                (next_pipe.x - self.x) / SCREEN_WIDTH,
-                (self.y - (next_pipe.top_height + PIPE_GAP/2)) / SCREEN_HEIGHT
-            ])
-            
-            output = self.brain.predict(inputs)
-            
-            if output[0] > 0.5:
-                self.flap()
+    def sense(self, index, next_pipe):
+        """Network inputs of the birds in index, as a (len(index), 5) array."""
+        y, velocity = self.y[index], self.velocity[index]
+        inputs = np.empty((len(index), 5), dtype=np.float32)
+        inputs[:, 0] = y / SCREEN_HEIGHT
+        inputs[:, 1] = (velocity + 10) / 20
+        inputs[:, 2] = next_pipe.top_height / SCREEN_HEIGHT
+        inputs[:, 3] = (next_pipe.x - self.x) / SCREEN_WIDTH
+        inputs[:, 4] = (y - (next_pipe.top_height + PIPE_GAP/2)) / SCREEN_HEIGHT
+        return inputs
+    
+    def move(self, index):
+        """Apply gravity to the birds in index and kill those leaving the screen."""
+        self.velocity[index] += GRAVITY
+        self.y[index] += self.velocity[index]
+        y = self.y[index]
+        out = (y >= SCREEN_HEIGHT - self.radius) | (y <= self.radius)
+        self.alive[index[out]] = False
+
+def flock_field(name):
+    """Property reading and writing a Bird's element of a Flock array."""
+    def get(self):
+        return getattr(self.flock, name)[self.index]
+    def set(self, value):
+        getattr(self.flock, name)[self.index] = value
+    return property(get, set)
+
+class Bird:
+    """One bird of a Flock, seen through its index."""
+    
+    y = flock_field("y")
+    velocity = flock_field("velocity")
+    alive = flock_field("alive")
+    score = flock_field("score")
+    pipes_passed = flock_field("pipes_passed")
+    
+    def __init__(self, flock, index):
+        self.flock = flock
+        self.index = index
+        self.x = flock.x
+        self.radius = flock.radius
+    
+    @property
+    def decision(self):
+        decision = self.flock.decision[self.index]
+        return None if np.isnan(decision) else float(decision)
     
     def draw(self, screen, show_brain=False):
         if not self.alive:
@@ -95,42 +144,25 @@ class Bird:
             (self.x + self.radius + beak_offset, self.y + 5)
         ])
         
-        if show_brain and self.alive:
-            next_pipe = None
-            for pipe in game.pipes:
-                if pipe.x + PIPE_WIDTH > self.x - 20:
-                    next_pipe = pipe
-                    break
-            
-            if next_pipe:
-                inputs = np.array([
-                    self.y / SCREEN_HEIGHT,
-                    (self.velocity + 10) / 20,
-                    next_pipe.top_height / SCREEN_HEIGHT,
-                    (next_pipe.x - self.x) / SCREEN_WIDTH,
-                    (self.y - (next_pipe.top_height + PIPE_GAP/2)) / SCREEN_HEIGHT
-                ])
-                output = self.brain.predict(inputs)[0]
-                
-                decision_x = self.x + 30
-                pygame.draw.rect(screen, BLACK, (decision_x - 15, self.y - 15, 30, 30), 1)
-                if output > 0.5:
-                    bar_height = (output - 0.5) * 30
-                    pygame.draw.rect(screen, GREEN, (decision_x - 14, self.y + 14 - bar_height, 28, bar_height))
+        if show_brain and self.decision is not None:
+            output = self.decision
+            decision_x = self.x + 30
+            pygame.draw.rect(screen, BLACK, (decision_x - 15, self.y - 15, 30, 30), 1)
+            if output > 0.5:
+                bar_height = (output - 0.5) * 30
+                pygame.draw.rect(screen, GREEN, (decision_x - 14, self.y + 14 - bar_height, 28, bar_height))
 
 class Pipe:
-    def __init__(self, x=None, top_height=None):
-        self.x = SCREEN_WIDTH if x is None else x
-        if top_height is None:
-            self.top_height = random.randint(100, SCREEN_HEIGHT - PIPE_GAP - 100)
-        else:
-            self.top_height = top_height
+    def __init__(self, x, top_height):
+        # Positions come from the game's seeded pipe sequence.
+        self.x = x
+        self.top_height = top_height
         self.bottom_height = self.top_height + PIPE_GAP
         self.passed = False
         self.speed = 2
     
-    def update(self, speed_factor=1):
-        self.x -= self.speed * speed_factor
+    def update(self):
+        self.x -= self.speed
     
     def draw(self, screen):
         pygame.draw.rect(screen, GREEN, (self.x, 0, PIPE_WIDTH, self.top_height))
@@ -142,76 +174,154 @@ class Pipe:
         gap_center = self.top_height + PIPE_GAP/2
         pygame.draw.line(screen, YELLOW, (self.x, gap_center), (self.x + PIPE_WIDTH, gap_center), 2)
     
-    def collides_with(self, bird):
-        if not bird.alive:
-            return False
-            
-        if (bird.x + bird.radius > self.x and bird.x - bird.radius < self.x + PIPE_WIDTH):
-            if (bird.y - bird.radius < self.top_height or bird.y + bird.radius > self.bottom_height):
-                return True
-        return False
+    def collisions(self, x, y, radius):
+        """Mask of the birds of radius at x and heights y that hit this pipe."""
+        if not (x + radius > self.x and x - radius < self.x + PIPE_WIDTH):
+            return np.zeros(len(y), dtype=bool)
+        return (y - radius < self.top_height) | (y + radius > self.bottom_height)
 
-class NeuralNetwork:
-    def __init__(self, input_size, hidden_size, output_size):
-        self.weights1 = np.random.randn(input_size, hidden_size) * np.sqrt(2./input_size)
-        self.weights2 = np.random.randn(hidden_size, output_size) * np.sqrt(2./hidden_size)
-        self.bias1 = np.zeros((1, hidden_size))
-        self.bias2 = np.zeros((1, output_size))
-    
-    def copy(self):
-        new_nn = NeuralNetwork(1, 1, 1)
-        new_nn.weights1 = self.weights1.copy()
-        new_nn.weights2 = self.weights2.copy()
-        new_nn.bias1 = self.bias1.copy()
-        new_nn.bias2 = self.bias2.copy()
-        return new_nn
-    
-    def predict(self, inputs):
-        hidden = np.dot(inputs, self.weights1) + self.bias1
-        hidden = np.maximum(0, hidden)
-        output = np.dot(hidden, self.weights2) + self.bias2
-        output = 1 / (1 + np.exp(-output))
-        return output
-    
-    def mutate(self, rate):
-        def mutate_array(arr):
-            mask = np.random.random(arr.shape) < rate
-            random_values = np.random.randn(*arr.shape) * 0.5
-            arr[mask] += random_values[mask]
-            arr = np.clip(arr, -5, 5)
-            return arr
+def predict_batch(inputs, weights1, bias1, weights2, bias2):
+    """Forward pass of network p on inputs[p] for every p at once."""
+    hidden = np.einsum('pi,pih->ph', inputs, weights1) + bias1[:, 0]
+    hidden = np.maximum(0, hidden)
+    output = np.einsum('ph,pho->po', hidden, weights2) + bias2[:, 0]
+    return 1 / (1 + np.exp(-output))
+
+class Population:
+    """Genomes of a whole flock as rows of one (P, GENOME_SIZE) float32 matrix.
+    
+    The next generation is written into a second preallocated matrix and
+    the two are swapped, so evolving allocates nothing per bird. The
+    network parameters are views of the current matrix, made by params().
+    """
+    
+    def __init__(self, size, rng=None):
+        self.size = size
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.genomes = np.zeros((size, GENOME_SIZE), dtype=np.float32)
+        self.spare = np.empty_like(self.genomes)
+        self._uniform = np.empty_like(self.genomes)
+        self._noise = np.empty_like(self.genomes)
+        self._mask = np.empty(self.genomes.shape, dtype=bool)
+        self.ranked = None
+        
+        # He initialisation for the weights, zero biases.
+        for name, view in zip((name for name, _ in BRAIN_LAYOUT), self.params()):
+            if name.startswith("weights"):
+                fan_in = view.shape[1]
+                view[...] = self.rng.standard_normal(view.shape, dtype=np.float32) * np.sqrt(2. / fan_in)
+    
+    def params(self):
+        """weights1 (P, 5, 8), bias1 (P, 1, 8), weights2 (P, 8, 1) and
+        bias2 (P, 1, 1) as views of the genome matrix."""
+        views, offset = [], 0
+        for _, (rows, cols) in BRAIN_LAYOUT:
+            views.append(self.genomes[:, offset:offset + rows * cols].reshape(self.size, rows, cols))
+            offset += rows * cols
+        return tuple(views)
+    
+    def mutate(self, rows, rate):
+        """Add N(0, 0.5) noise to a fraction rate of the genes in rows
+        (a slice of a genome matrix), then clip to [-5, 5], in place."""
+        n = len(rows)
+        uniform, noise, mask = self._uniform[:n], self._noise[:n], self._mask[:n]
+        self.rng.random(dtype=np.float32, out=uniform)
+        np.less(uniform, rate, out=mask)
+        self.rng.standard_normal(dtype=np.float32, out=noise)
+        noise *= 0.5
+        noise *= mask
+        rows += noise
+        np.clip(rows, -5, 5, out=rows)
+    
+    def evolve(self, fitness, extra_mutation=False):
+        """Breed the next generation from fitness (one value per row).
+        
+        The two fittest genomes carry over, and every other row is the
+        winner of a tournament of three drawn from the top fifth. The result
+        replaces the current matrix, row i being bird i's new genome.
+        """
+        ranked = self.ranked = np.argsort(-fitness, kind="stable")
+        top = ranked[:max(2, self.size // 5)]
+        nxt = self.spare
+        
+        np.take(self.genomes, top[:2], axis=0, out=nxt[:2])
+        self.mutate(nxt[:2], 0.1)
+        
+        # Tournaments: sample distinct ranks within the top group; the
+        # lowest rank drawn is the fittest entrant.
+        children = max(0, self.size - 2)
+        k = min(3, len(top))
+        picks = self.rng.integers(0, len(top), (children, k))
+        picks.sort(axis=1)
+        while True:
+            clash = (picks[:, 1:] == picks[:, :-1]).any(axis=1)
+            if not clash.any():
+                break
+            picks[clash] = self.rng.integers(0, len(top), (np.count_nonzero(clash), k))
+            picks.sort(axis=1)
+        np.take(self.genomes, top[picks[:, 0]], axis=0, out=nxt[2:])
+        self.mutate(nxt[2:], 0.15)
+        self.mutate(nxt[2:], 0.1)
         
-        self.weights1 = mutate_array(self.weights1)
-        self.weights2 = mutate_array(self.weights2)
-        self.bias1 = mutate_array(self.bias1)
-        self.bias2 = mutate_array(self.bias2)
+        if extra_mutation:
+            self.mutate(nxt, 0.02)
+        self.genomes, self.spare = nxt, self.genomes
+    
+    def emigrants(self, count):
+        """Copies of the count fittest genomes of the generation the last
+        evolve() replaced, or of the first rows before any evolve()."""
+        if self.ranked is None:
+            return self.genomes[:count].copy()
+        return self.spare[self.ranked[:count]]
+    
+    def immigrate(self, genomes):
+        """Overwrite the last rows with genomes from elsewhere. Those rows
+        are tournament children, so the two elites are never replaced."""
+        count = min(len(genomes), self.size - 2)
+        if count > 0:
+            self.genomes[self.size - count:] = genomes[:count]
 
 class Game:
-    def __init__(self, population_size=50):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Flappy Bird AI - Consistent Obstacles")
-        self.clock = pygame.time.Clock()
+    """The flock, the pipes and the evolution between generations.
+    
+    Game time is an integer tick count: every step() moves the pipes and
+    birds once and pipes spawn every PIPE_INTERVAL ticks. The speed factor
+    only sets how many steps run per rendered frame, so with the same seed
+    an episode plays out identically at any speed, with or without a
+    window.
+    """
+    
+    def __init__(self, population_size=50, headless=False, seed=None, pipe_sequence=None):
+        self.headless = headless
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        if not headless:
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Flappy Bird AI - Consistent Obstacles")
+            self.clock = pygame.time.Clock()
+        self.ticks = 0
         self.speed_factor = 1
         self.show_brain = False
         self.population_size = population_size
-        self.pipe_sequence = []
+        self.pipe_sequence = list(pipe_sequence or [])
+        self.migrants = None
+        self.islands = None
         self.reset()
     
     def generate_pipe_sequence(self):
-        self.pipe_sequence = []
-        x = SCREEN_WIDTH
-        for _ in range(50):
-            top_height = random.randint(100, SCREEN_HEIGHT - PIPE_GAP - 100)
-            self.pipe_sequence.append((x, top_height))
-            x += PIPE_FREQUENCY // 2
+        self.pipe_sequence = make_pipe_sequence(self.random)
     
     def reset(self):
         if not self.pipe_sequence:
             self.generate_pipe_sequence()
         
-        self.birds = [Bird(100, SCREEN_HEIGHT // 2) for _ in range(self.population_size)]
+        self.population = Population(self.population_size, self.rng)
+        self.brains = self.population.params()
+        self.flock = Flock(self.population_size)
+        self.birds = [Bird(self.flock, index) for index in range(self.population_size)]
         self.pipes = []
-        self.last_pipe_time = pygame.time.get_ticks()
+        self.last_pipe_tick = self.ticks
         self.generation = 1
         self.best_score = 0
         self.best_pipes_passed = 0
@@ -224,38 +334,46 @@ class Game:
             x, top_height = self.pipe_sequence[self.next_pipe_index]
             self.pipes.append(Pipe(x, top_height))
             self.next_pipe_index += 1
-            self.last_pipe_time = pygame.time.get_ticks()
+            self.last_pipe_tick = self.ticks
+    
+    def next_pipe(self):
+        for pipe in self.pipes:
+            if pipe.x + PIPE_WIDTH > BIRD_X - 20:
+                return pipe
+        return None
+    
+    def think(self, index):
+        """Run the networks of the birds in index in one batched pass and
+        flap the birds whose output is above 0.5."""
+        next_pipe = self.next_pipe()
+        if next_pipe is None or not len(index):
+            return
+        if 2 * len(index) > len(self.flock):
+            # Gathering the parameters of most of the flock costs more than
+            # running every network and dropping the grounded birds' outputs.
+            everyone = np.arange(len(self.flock))
+            inputs = self.flock.sense(everyone, next_pipe)
+            outputs = predict_batch(inputs, *self.brains)[index, 0]
+        else:
+            inputs = self.flock.sense(index, next_pipe)
+            outputs = predict_batch(inputs, *(param[index] for param in self.brains))[:, 0]
+        self.flock.decision[index] = outputs
+        self.flock.velocity[index[outputs > 0.5]] = FLAP_STRENGTH
     
     def natural_selection(self):
-        for bird in self.birds:
-            bird.fitness = bird.score + bird.pipes_passed * 500
-        
-        self.birds.sort(key=lambda x: x.fitness, reverse=True)
-        
-        top_birds = self.birds[:max(2, len(self.birds)//5)]
+        fitness = (self.flock.score + self.flock.pipes_passed * 500).astype(np.float64)
         
-        new_birds = []
-        
-        for bird in top_birds[:2]:
-            new_bird = Bird(100, SCREEN_HEIGHT // 2, bird.brain)
-            new_birds.append(new_bird)
-        
-        for _ in range(self.population_size - 2):
-            candidates = random.sample(top_birds, min(3, len(top_birds)))
-            parent = max(candidates, key=lambda x: x.fitness)
-            child_brain = parent.brain.copy()
-            child_brain.mutate(0.15)
-            new_birds.append(Bird(100, SCREEN_HEIGHT // 2, child_brain))
-        
-        self.birds = new_birds
         self.generation += 1
+        self.population.evolve(fitness, extra_mutation=self.generation % 20 == 0)
+        if self.migrants is not None:
+            self.population.immigrate(self.migrants)
+            self.migrants = None
+        self.brains = self.population.params()
+        self.flock.respawn()
+        
         self.pipes = []
         self.next_pipe_index = 0
         self.add_pipe()
-        
-        if self.generation % 20 == 0:
-            for bird in self.birds:
-                bird.brain.mutate(0.02)
     
     def handle_events(self):
         for event in pygame.event.get():
@@ -275,48 +393,45 @@ class Game:
                     self.speed_factor = event.key - K_0
     
     def update(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_pipe_time > PIPE_FREQUENCY / self.speed_factor:
+        """Run one frame's worth of ticks."""
+        for _ in range(self.speed_factor):
+            self.step()
+    
+    def step(self):
+        """Advance the game by one tick."""
+        self.ticks += 1
+        if self.ticks - self.last_pipe_tick > PIPE_INTERVAL:
             self.add_pipe()
         
         for pipe in self.pipes[:]:
-            pipe.update(self.speed_factor)
+            pipe.update()
             if pipe.x < -PIPE_WIDTH:
                 self.pipes.remove(pipe)
         
-        alive_birds = [bird for bird in self.birds if bird.alive]
+        flock = self.flock
+        flying = np.flatnonzero(flock.alive)
         
-        if not alive_birds:
+        if not len(flying):
             self.natural_selection()
             return
         
-        for _ in range(min(3, self.speed_factor)):
-            for bird in alive_birds[:]:
-                if not bird.alive:
-                    alive_birds.remove(bird)
-                    continue
-                
-                bird.think(self.pipes)
-                bird.update()
-                bird.score += 1
-                
-                for pipe in self.pipes:
-                    if pipe.collides_with(bird):
-                        bird.alive = False
-                
-                for pipe in self.pipes:
-                    if not pipe.passed and pipe.x + PIPE_WIDTH < bird.x:
-                        pipe.passed = True
-                        bird.pipes_passed += 1
-                        bird.score += 1000
+        self.think(flying)
+        flock.move(flying)
+        flock.score[flying] += 1
         
-        current_max_pipes = max(bird.pipes_passed for bird in self.birds)
-        if current_max_pipes > self.best_pipes_passed:
-            self.best_pipes_passed = current_max_pipes
+        y = flock.y[flying]
+        for pipe in self.pipes:
+            flock.alive[flying[pipe.collisions(flock.x, y, flock.radius)]] = False
+        
+        # Every bird that flew this tick is credited with the pipes it cleared.
+        for pipe in self.pipes:
+            if not pipe.passed and pipe.x + PIPE_WIDTH < flock.x:
+                pipe.passed = True
+                flock.pipes_passed[flying] += 1
+                flock.score[flying] += 1000
         
-        current_max_score = max(bird.score for bird in self.birds)
-        if current_max_score > self.best_score:
-            self.best_score = current_max_score
+        self.best_pipes_passed = max(self.best_pipes_passed, int(flock.pipes_passed.max()))
+        self.best_score = max(self.best_score, int(flock.score.max()))
     
     def draw(self):
         self.screen.fill(SKY_BLUE)
@@ -325,20 +440,22 @@ class Game:
             pipe.draw(self.screen)
         
         # Only draw alive birds
-        for bird in self.birds:
-            if bird.alive:
-                bird.draw(self.screen, self.show_brain)
+        for index in np.flatnonzero(self.flock.alive):
+            self.birds[index].draw(self.screen, self.show_brain)
         
-        alive_count = sum(1 for bird in self.birds if bird.alive)
+        alive_count = np.count_nonzero(self.flock.alive)
         stats_text = [
             f"Generation: {self.generation}",
-            f"Alive: {alive_count}/{len(self.birds)}",
+            f"Alive: {alive_count}/{len(self.flock)}",
             f"Best Pipes Passed: {self.best_pipes_passed}",
-            f"Current Max Pipes: {max(bird.pipes_passed for bird in self.birds) if self.birds else 0}",
+            f"Current Max Pipes: {self.flock.pipes_passed.max() if len(self.flock) else 0}",
             f"Speed: {self.speed_factor}x (1-9,0)",
             f"Show Brain: {'ON' if self.show_brain else 'OFF'} (B)",
             f"Press R to generate new obstacles"
         ]
+        if self.islands is not None and self.islands.epoch:
+            stats_text.append(f"Islands: {self.islands.count}, epoch {self.islands.epoch}, "
+                              f"best pipes {self.islands.best_pipes_passed}")
         
         for i, text in enumerate(stats_text):
             text_surface = FONT.render(text, True, BLACK)
@@ -346,15 +463,268 @@ class Game:
         
         pygame.display.flip()
     
-    def run(self):
+    def run(self, islands=None):
+        """Play in a window. Given an IslandTrainer, the islands keep
+        training in the background and the champions of each epoch join
+        the next generation on screen."""
+        self.islands = islands
+        if islands is not None:
+            islands.start_epoch()
         while self.running:
             self.handle_events()
+            if islands is not None and islands.poll():
+                self.migrants = islands.champions
+                if not islands.finished:
+                    islands.start_epoch()
             self.update()
             self.draw()
             self.clock.tick(60)
         
         pygame.quit()
+    
+    def course_finished(self):
+        return self.next_pipe_index >= len(self.pipe_sequence) and not self.pipes
+    
+    def train(self, max_generations=None, target_pipes=None):
+        """Run generations back to back with no drawing or frame cap.
+        
+        Stops once a bird has passed target_pipes pipes, after
+        max_generations generations, or when a bird outlives the whole
+        pipe sequence. Returns the run's statistics.
+        """
+        start_ticks, start_generation = self.ticks, self.generation
+        start = time.perf_counter()
+        while True:
+            if target_pipes is not None and self.best_pipes_passed >= target_pipes:
+                reason = "target"
+                break
+            if max_generations is not None and self.generation - start_generation >= max_generations:
+                reason = "generations"
+                break
+            if self.course_finished():
+                reason = "course finished"
+                break
+            self.step()
+        elapsed = time.perf_counter() - start
+        
+        generations = self.generation - start_generation
+        ticks = self.ticks - start_ticks
+        return {
+            "population": self.population_size,
+            "seed": self.seed,
+            "stopped": reason,
+            "generations": generations,
+            "ticks": ticks,
+            "seconds": round(elapsed, 6),
+            "generations_per_sec": round(generations / elapsed, 2) if elapsed else None,
+            "ticks_per_sec": round(ticks / elapsed, 2) if elapsed else None,
+            "best_pipes_passed": self.best_pipes_passed,
+            "best_score": self.best_score,
+        }
+
+def _island_worker(index, population_size, seed, pipe_sequence, migrants, commands, results):
+    game = Game(population_size, headless=True, seed=seed, pipe_sequence=pipe_sequence)
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        generations, target_pipes, arrivals = command
+        # train() stops right after a selection, so the arrivals replace
+        # children that have not flown yet.
+        if arrivals is not None:
+            game.population.immigrate(arrivals)
+        stats = game.train(generations, target_pipes)
+        results.put((index, stats, game.population.emigrants(migrants)))
+
+class IslandTrainer:
+    """Several populations evolving side by side, one worker process each.
+    
+    Every island is a headless Game with its own seed (seed + island
+    index) flying the same pipe sequence. Training runs in epochs of
+    migrate_every generations. After each epoch the coordinator collects
+    every island's stats and its fittest genomes, and hands those to the
+    next island in a ring, where they replace tournament children. The
+    islands only meet between epochs, so a run is deterministic for a
+    seed however the processes are scheduled.
+    """
+    
+    def __init__(self, islands=None, population_size=50, seed=0, migrate_every=10,
+                 migrants=2, target_pipes=None):
+        self.count = max(1, islands or os.cpu_count() or 1)
+        self.population_size = population_size
+        self.seed = seed
+        self.migrate_every = max(1, migrate_every)
+        self.migrants = max(0, min(migrants, population_size - 2))
+        self.target_pipes = target_pipes
+        self.epoch = 0
+        self.pending = 0
+        self.stats = [None] * self.count
+        self.emigrants = [None] * self.count
+        self.arrivals = [None] * self.count
+        self.champions = None
+        
+        ctx = mp.get_context()
+        self.commands = [ctx.Queue() for _ in range(self.count)]
+        self.results = ctx.Queue()
+        pipe_sequence = make_pipe_sequence(random.Random(seed))
+        self.workers = [
+            ctx.Process(target=_island_worker, daemon=True,
+                        args=(index, population_size, seed + index, pipe_sequence,
+                              self.migrants, self.commands[index], self.results))
+            for index in range(self.count)
+        ]
+        for worker in self.workers:
+            worker.start()
+    
+    @property
+    def best_pipes_passed(self):
+        return max((stats["best_pipes_passed"] for stats in self.stats if stats), default=0)
+    
+    @property
+    def best_score(self):
+        return max((stats["best_score"] for stats in self.stats if stats), default=0)
+    
+    @property
+    def finished(self):
+        """The reason training is over, once an island has reached
+        target_pipes or got through the whole pipe sequence."""
+        stopped = {stats["stopped"] for stats in self.stats if stats}
+        for reason in ("target", "course finished"):
+            if reason in stopped:
+                return reason
+        return None
+    
+    def start_epoch(self, generations=None):
+        """Send every island off to run generations (default migrate_every)
+        generations, with the migrants it was last dealt."""
+        generations = self.migrate_every if generations is None else generations
+        for commands, arrivals in zip(self.commands, self.arrivals):
+            commands.put((generations, self.target_pipes, arrivals))
+        self.pending = self.count
+    
+    def poll(self, block=False):
+        """Collect finished islands. Returns True once the last island of
+        the current epoch is in and the migrants have been dealt."""
+        if not self.pending:
+            return False
+        while self.pending:
+            try:
+                index, stats, emigrants = self.results.get(block)
+            except queue.Empty:
+                return False
+            self.stats[index] = stats
+            self.emigrants[index] = emigrants
+            self.pending -= 1
+        
+        self.epoch += 1
+        self.arrivals = [self.emigrants[index - 1] if self.migrants else None
+                         for index in range(self.count)]
+        ranked = sorted(range(self.count), reverse=True,
+                        key=lambda index: (self.stats[index]["best_pipes_passed"],
+                                           self.stats[index]["best_score"]))
+        self.champions = np.concatenate([self.emigrants[index] for index in ranked])
+        return True
+    
+    def train(self, max_generations=None):
+        """Run epochs until an island reaches target_pipes or gets through
+        the whole pipe sequence, or until every island has run
+        max_generations generations. Returns the combined statistics."""
+        generations = ticks = 0
+        reason = None
+        start = time.perf_counter()
+        while reason is None:
+            if max_generations is not None and generations >= max_generations:
+                reason = "generations"
+                break
+            epoch = self.migrate_every
+            if max_generations is not None:
+                epoch = min(epoch, max_generations - generations)
+            self.start_epoch(epoch)
+            self.poll(block=True)
+            generations += max(stats["generations"] for stats in self.stats)
+            ticks += sum(stats["ticks"] for stats in self.stats)
+            reason = self.finished
+        elapsed = time.perf_counter() - start
+        
+        return {
+            "islands": self.count,
+            "population": self.population_size,
+            "seed": self.seed,
+            "migrate_every": self.migrate_every,
+            "migrants": self.migrants,
+            "stopped": reason,
+            "epochs": self.epoch,
+            "generations": generations,
+            "ticks": ticks,
+            "seconds": round(elapsed, 6),
+            "generations_per_sec": round(generations / elapsed, 2) if elapsed else None,
+            "ticks_per_sec": round(ticks / elapsed, 2) if elapsed else None,
+            "best_pipes_passed": self.best_pipes_passed,
+            "best_score": self.best_score,
+            "per_island": [
+                {"seed": stats["seed"], "best_pipes_passed": stats["best_pipes_passed"],
+                 "best_score": stats["best_score"]}
+                for stats in self.stats
+            ],
+        }
+    
+    def close(self):
+        if not self.workers:
+            return
+        if self.pending:
+            # Islands only read their queue between epochs, so ones still
+            # training are stopped rather than waited for. SDL catches
+            # SIGTERM in every process that imported pygame, hence kill().
+            for worker in self.workers:
+                worker.kill()
+            for commands in self.commands:
+                commands.cancel_join_thread()
+            self.results.cancel_join_thread()
+            self.pending = 0
+        else:
+            for commands in self.commands:
+                commands.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Flappy Bird neuroevolution")
+    parser.add_argument("--headless", action="store_true",
+                        help="train without a window as fast as possible and print the result as JSON")
+    parser.add_argument("--population", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the pipes and the evolution")
+    parser.add_argument("--generations", type=int, help="stop after this many generations")
+    parser.add_argument("--target-pipes", type=int, help="stop once a bird has passed this many pipes")
+    parser.add_argument("--islands", type=int,
+                        help="evolve this many populations in parallel worker processes (0: one per CPU core)")
+    parser.add_argument("--migrate-every", type=int, default=10,
+                        help="generations between migrations between islands")
+    parser.add_argument("--migrants", type=int, default=2,
+                        help="genomes each island sends to the next one per migration")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    game = Game(population_size=50)
-    game.run()
\ No newline at end of file
+    args = parse_args()
+    if args.headless and args.generations is None and args.target_pipes is None:
+        args.generations = 100
+    if args.islands is not None:
+        # The workers start before any window opens.
+        with IslandTrainer(args.islands, args.population, args.seed, args.migrate_every,
+                           args.migrants, args.target_pipes) as islands:
+            if args.headless:
+                print(json.dumps(islands.train(args.generations)))
+            else:
+                Game(population_size=args.population, seed=args.seed).run(islands)
+    elif args.headless:
+        game = Game(population_size=args.population, headless=True, seed=args.seed)
+        print(json.dumps(game.train(args.generations, args.target_pipes)))
+    else:
+        game = Game(population_size=args.population, seed=args.seed)
+        game.run()
\ No newline at end of file
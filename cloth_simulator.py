@@ -1,152 +1,949 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
 import pygame
+import argparse
+import hashlib
+import json
 import sys
-import math
-import random
+import time
+import numpy as np
 
-pygame.init()
 width, height = 800, 600
-screen = pygame.display.set_mode((width, height))
-clock = pygame.time.Clock()
 
-cols, rows = 30, 20
 spacing = 20
 gravity_val = 0.5
 damping = 0.99
 wind_strength = 2
 
-class Point:
-    def __init__(self, x, y, pinned=False):
-        self.x = x
-        self.y = y
-        self.old_x = x
-        self.old_y = y
-        self.pinned = pinned
+PHYSICS_STEP = 1 / 60
+MAX_STEPS_PER_FRAME = 4
+SUBSTEP_OPTIONS = [1, 2, 4, 8]
+MAX_ITERATIONS = 40
+PICK_RADIUS = 10
+CUT_RADIUS = 8
+BALL_RADIUS = 30
+POLYLINE_THICKNESS = 4
+OBSTACLE_COLOR = (70, 110, 160)
+# Points closer than this that are not cloth neighbours push apart.
+SELF_COLLIDE_DISTANCE = spacing / 2
 
-    def update(self, gravity_on):
-        if self.pinned:
-            return
-        vx = (self.x - self.old_x) * damping
-        vy = (self.y - self.old_y) * damping
-        self.old_x = self.x
-        self.old_y = self.y
-        self.x += vx
-        self.y += vy + (gravity_val if gravity_on else 0)
+LINK_COLOR = (200, 200, 200)
+STRESS_BINS = 8
+# Stress colours run from relaxed grey through yellow to red at the tear limit.
+STRESS_PALETTE = [
+    tuple(int(np.interp(t, [0, 0.5, 1], channel))
+          for channel in zip((200, 200, 200), (255, 220, 0), (255, 40, 40)))
+    for t in np.linspace(0, 1, STRESS_BINS)
+]
+
+class Cloth:
+    """Cloth point masses stored as contiguous arrays.
+
+    pos and old hold the current and previous (x, y) of every point for
+    Verlet integration, and pinned marks the points that stay fixed.
+    """
+
+    def __init__(self, positions, pinned):
+        self.pos = np.array(positions, dtype=float)
+        self.old = self.pos.copy()
+        self.pinned = np.array(pinned, dtype=bool)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def update(self, gravity_on, scale=1.0):
+        """Verlet step; scale is the step length as a fraction of a frame."""
+        free = ~self.pinned
+        velocity = (self.pos[free] - self.old[free]) * damping ** scale
+        velocity[:, 1] += gravity_val * scale * scale if gravity_on else 0
+        self.old[free] = self.pos[free]
+        self.pos[free] += velocity
+
+    def apply_wind(self, rng):
+        free = ~self.pinned
+        self.pos[free] += rng.uniform(-wind_strength, wind_strength, (np.count_nonzero(free), 2))
 
     def constrain(self):
-        self.x = max(0, min(width, self.x))
-        self.y = min(height, self.y)
-
-class Constraint:
-    def __init__(self, p1, p2):
-        self.p1 = p1
-        self.p2 = p2
-        self.length = math.dist((p1.x, p1.y), (p2.x, p2.y))
-        self.broken = False
-
-    def solve(self):
-        if self.broken:
-            return
-        dx = self.p2.x - self.p1.x
-        dy = self.p2.y - self.p1.y
-        distance = math.hypot(dx, dy)
-        if distance == 0:
+        np.clip(self.pos[:, 0], 0, width, out=self.pos[:, 0])
+        np.minimum(self.pos[:, 1], height, out=self.pos[:, 1])
+
+GRID_OFFSET = 1 << 20
+
+def grid_cells(xy, cell_size):
+    """Integer grid cell of each position, offset to keep it positive."""
+    return np.floor(np.asarray(xy) / cell_size).astype(np.int64) + GRID_OFFSET
+
+def cell_keys(cx, cy):
+    return (cx << 21) | cy
+
+def expand_ranges(first, last):
+    """Flatten index ranges first[k]:last[k] into (k, index) pairs."""
+    counts = last - first
+    owner = np.repeat(np.arange(len(first)), counts)
+    index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, index + first[owner]
+
+class SpatialHash:
+    """Uniform grid over point positions for cursor queries.
+
+    build() buckets every point by its grid cell with one argsort, and a
+    query only looks at the points of the cells its search box overlaps,
+    so picking and cutting cost the same on any cloth size.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.pos = np.empty((0, 2))
+        self.keys = np.empty(0, dtype=np.int64)
+        self.order = np.empty(0, dtype=np.intp)
+
+    def _cell(self, xy):
+        return grid_cells(xy, self.cell_size)
+
+    def build(self, pos):
+        self.pos = pos.copy()
+        cells = self._cell(pos)
+        keys = cell_keys(cells[:, 0], cells[:, 1])
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def candidates(self, lo, hi):
+        """Indices of the points in every cell of the box lo..hi."""
+        (x0, y0), (x1, y1) = self._cell(lo), self._cell(hi)
+        found = []
+        for cx in range(x0, x1 + 1):
+            first = np.searchsorted(self.keys, cell_keys(cx, y0))
+            last = np.searchsorted(self.keys, cell_keys(cx, y1), side="right")
+            found.append(self.order[first:last])
+        return np.concatenate(found)
+
+    def pairs(self, radius):
+        """All point pairs (i < j) closer than radius, which must not exceed
+        the cell size. Returns i, j, the offsets pos[j] - pos[i] and the
+        distances."""
+        # Each pair of neighbouring cells is visited from one side only.
+        # Points are walked in key order, which keeps searchsorted's
+        # needles sorted and its memory access local.
+        cells = self._cell(self.pos[self.order])
+        found_i, found_j = [], []
+        for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            keys = cell_keys(cells[:, 0] + dx, cells[:, 1] + dy)
+            first = np.searchsorted(self.keys, keys)
+            last = np.searchsorted(self.keys, keys, side="right")
+            owner, index = expand_ranges(first, last)
+            i, j = self.order[owner], self.order[index]
+            if dx == dy == 0:
+                i, j = i[i < j], j[i < j]
+            found_i.append(np.minimum(i, j))
+            found_j.append(np.maximum(i, j))
+        i, j = np.concatenate(found_i), np.concatenate(found_j)
+        d = self.pos[j] - self.pos[i]
+        distance = np.hypot(d[:, 0], d[:, 1])
+        close = distance < radius
+        return i[close], j[close], d[close], distance[close]
+
+    def query(self, x, y, radius):
+        """Points within radius of (x, y), nearest first."""
+        found = self.candidates((x - radius, y - radius), (x + radius, y + radius))
+        d = np.hypot(*(self.pos[found] - (x, y)).T)
+        inside = d <= radius
+        return found[inside][np.argsort(d[inside], kind="stable")]
+
+    def query_segment(self, p0, p1, radius):
+        """Points within radius of the segment p0-p1."""
+        lo = np.minimum(p0, p1) - radius
+        hi = np.maximum(p0, p1) + radius
+        found = self.candidates(lo, hi)
+        return found[point_segment_distance(self.pos[found], p0, p1) <= radius]
+
+BOX_FACES = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)], dtype=float)
+
+class Obstacles:
+    """Circles, boxes and polylines the cloth collides with.
+
+    Circles and polyline segments are both kept as capsules (a segment
+    plus a radius; a circle's segment has zero length) and boxes as
+    axis-aligned corners. Every primitive is registered in the cells of a
+    uniform grid its bounding box overlaps, so each point is only tested
+    against the obstacles sharing its cell. Shapes are numbered in the
+    order they were added; removed ones leave a None behind.
+    """
+
+    def __init__(self, cell_size=40):
+        self.cell_size = cell_size
+        self.shapes = []
+        self._dirty = True
+
+    def __len__(self):
+        return sum(shape is not None for shape in self.shapes)
+
+    def add(self, kind, *params):
+        """Add a "circle" (x, y, r), "box" (x0, y0, x1, y1) or
+        "polyline" (points, thickness); returns the new shape's id."""
+        self.shapes.append((kind, params))
+        self._dirty = True
+        return len(self.shapes) - 1
+
+    def remove(self, shape):
+        self.shapes[shape] = None
+        self._dirty = True
+
+    def move_to(self, shape, x, y):
+        """Move a shape so its anchor (circle or box centre, first polyline
+        vertex) sits at (x, y)."""
+        kind, params = self.shapes[shape]
+        if kind == "circle":
+            params = (x, y, params[2])
+        elif kind == "box":
+            x0, y0, x1, y1 = params
+            dx, dy = x - (x0 + x1) / 2, y - (y0 + y1) / 2
+            params = (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+        else:
+            points, thickness = params
+            dx, dy = x - points[0][0], y - points[0][1]
+            params = ([(px + dx, py + dy) for px, py in points], thickness)
+        self.shapes[shape] = (kind, params)
+        self._dirty = True
+
+    def _build(self):
+        capsules, boxes = [], []
+        for shape in self.shapes:
+            if shape is None:
+                continue
+            kind, params = shape
+            if kind == "circle":
+                x, y, r = params
+                capsules.append((x, y, x, y, r))
+            elif kind == "box":
+                boxes.append(params)
+            else:
+                points, thickness = params
+                capsules += [(*a, *b, thickness) for a, b in zip(points, points[1:])]
+        self.capsules = np.array(capsules, dtype=float).reshape(-1, 5)
+        self.boxes = np.array(boxes, dtype=float).reshape(-1, 4)
+
+        # Bounding boxes of every primitive, capsules first.
+        r = self.capsules[:, 4:]
+        lo = np.concatenate([np.minimum(self.capsules[:, 0:2], self.capsules[:, 2:4]) - r,
+                             self.boxes[:, 0:2]])
+        hi = np.concatenate([np.maximum(self.capsules[:, 0:2], self.capsules[:, 2:4]) + r,
+                             self.boxes[:, 2:4]])
+        keys, ids = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.intp)]
+        for n, ((x0, y0), (x1, y1)) in enumerate(zip(grid_cells(lo, self.cell_size),
+                                                     grid_cells(hi, self.cell_size))):
+            cx, cy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+            keys.append(cell_keys(cx, cy).ravel())
+            ids.append(np.full(cx.size, n))
+        keys, ids = np.concatenate(keys), np.concatenate(ids)
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.ids = keys[order], ids[order]
+        self._dirty = False
+
+    def collide(self, cloth):
+        """Push every free point out of the obstacles it has entered."""
+        if not len(self):
             return
-        difference = self.length - distance
-        percent = difference / distance / 2
-        offset_x = dx * percent
-        offset_y = dy * percent
-
-        if not self.p1.pinned:
-            self.p1.x -= offset_x
-            self.p1.y -= offset_y
-        if not self.p2.pinned:
-            self.p2.x += offset_x
-            self.p2.y += offset_y
-
-    def tear_if_stretched(self, max_stretch=40):
-        dx = self.p2.x - self.p1.x
-        dy = self.p2.y - self.p1.y
-        distance = math.hypot(dx, dy)
-        if distance > self.length + max_stretch:
-            self.broken = True
-
-def create_cloth():
-    points = []
-    constraints = []
+        if self._dirty:
+            self._build()
+        free = np.flatnonzero(~cloth.pinned)
+        cells = grid_cells(cloth.pos[free], self.cell_size)
+        keys = cell_keys(cells[:, 0], cells[:, 1])
+        owner, index = expand_ranges(np.searchsorted(self.keys, keys),
+                                     np.searchsorted(self.keys, keys, side="right"))
+        points, prims = free[owner], self.ids[index]
+        capsule = prims < len(self.capsules)
+        self._push_out_of_capsules(cloth.pos, points[capsule], prims[capsule])
+        self._push_out_of_boxes(cloth.pos, points[~capsule], prims[~capsule] - len(self.capsules))
+
+    def _push_out_of_capsules(self, pos, points, prims):
+        p = pos[points]
+        a, b, r = self.capsules[prims, 0:2], self.capsules[prims, 2:4], self.capsules[prims, 4]
+        ab = b - a
+        length2 = np.einsum("ij,ij->i", ab, ab)
+        t = np.divide(np.einsum("ij,ij->i", p - a, ab), length2,
+                      out=np.zeros(len(p)), where=length2 != 0)
+        away = p - (a + np.clip(t, 0, 1)[:, None] * ab)
+        distance = np.hypot(away[:, 0], away[:, 1])
+        hit = (distance < r) & (distance > 0)
+        depth = (r[hit] - distance[hit]) / distance[hit]
+        np.add.at(pos, points[hit], away[hit] * depth[:, None])
+
+    def _push_out_of_boxes(self, pos, points, prims):
+        p = pos[points]
+        x0, y0, x1, y1 = self.boxes[prims].T
+        depth = np.stack([p[:, 0] - x0, x1 - p[:, 0], p[:, 1] - y0, y1 - p[:, 1]], axis=1)
+        inside = (depth > 0).all(axis=1)
+        face = depth[inside].argmin(axis=1)
+        push = BOX_FACES[face] * depth[inside][np.arange(len(face)), face][:, None]
+        np.add.at(pos, points[inside], push)
+
+def self_collide(cloth, grid, cols, min_distance=SELF_COLLIDE_DISTANCE):
+    """Coarse self-collision: push apart points closer than min_distance
+    that are not neighbours in the cloth grid."""
+    grid.build(cloth.pos)
+    i, j, d, distance = grid.pairs(min_distance)
+    apart = ((np.abs(i % cols - j % cols) > 1) | (np.abs(i // cols - j // cols) > 1)) & (distance > 0)
+    i, j, d, distance = i[apart], j[apart], d[apart], distance[apart]
+    push = d * ((min_distance - distance) / distance / 2)[:, None]
+    movable = (~cloth.pinned).astype(float)[:, None]
+    np.add.at(cloth.pos, i, -push * movable[i])
+    np.add.at(cloth.pos, j, push * movable[j])
+
+def obstacle_scene():
+    """A few static obstacles below the default cloth."""
+    return [("circle", 250, 480, 40),
+            ("box", 420, 470, 560, 520),
+            ("polyline", [(600, 420), (680, 470), (760, 440)], POLYLINE_THICKNESS)]
+
+def draw_obstacles(screen, obstacles):
+    for shape in obstacles.shapes:
+        if shape is None:
+            continue
+        kind, params = shape
+        if kind == "circle":
+            x, y, r = params
+            pygame.draw.circle(screen, OBSTACLE_COLOR, (int(x), int(y)), int(r))
+        elif kind == "box":
+            x0, y0, x1, y1 = params
+            pygame.draw.rect(screen, OBSTACLE_COLOR, pygame.Rect(x0, y0, x1 - x0, y1 - y0))
+        else:
+            points, thickness = params
+            pygame.draw.lines(screen, OBSTACLE_COLOR, False, points, int(2 * thickness))
+
+def point_segment_distance(p, a, b):
+    """Distance from each point p to the segment(s) a-b."""
+    ab = np.asarray(b, dtype=float) - a
+    length2 = np.einsum("...i,...i->...", ab, ab)
+    t = np.divide(np.einsum("...i,...i->...", p - a, ab), length2,
+                  out=np.zeros(np.broadcast(p[..., 0], length2).shape),
+                  where=length2 != 0)
+    closest = a + np.clip(t, 0, 1)[..., None] * ab
+    return np.hypot(*np.moveaxis(p - closest, -1, 0))
+
+def segment_distance(a, b, c, d):
+    """Shortest distance between segments a-b (arrays) and c-d."""
+    def cross(o, p, q):
+        return ((p[..., 0] - o[..., 0]) * (q[..., 1] - o[..., 1])
+                - (p[..., 1] - o[..., 1]) * (q[..., 0] - o[..., 0]))
+
+    c, d = np.asarray(c, dtype=float), np.asarray(d, dtype=float)
+    crossing = ((np.sign(cross(a, b, c)) * np.sign(cross(a, b, d)) < 0)
+                & (np.sign(cross(c, d, a)) * np.sign(cross(c, d, b)) < 0))
+    nearest = np.minimum.reduce([point_segment_distance(a, c, d),
+                                 point_segment_distance(b, c, d),
+                                 point_segment_distance(c, a, b),
+                                 point_segment_distance(d, a, b)])
+    return np.where(crossing, 0.0, nearest)
+
+class Constraints:
+    """Distance constraints stored as index arrays (i, j, rest length).
+
+    The constraints are split into colour groups in which no two
+    constraints share a point. Each group is solved in one vectorised pass
+    whose scatter-add of corrections cannot collide. Solving the groups
+    one after another propagates corrections the way solving them one at
+    a time did.
+
+    Torn constraints are dropped from their group as soon as they break,
+    so a shredded cloth costs less to solve and draw than an intact one.
+
+    chains lists the point indices of every row and column back to back,
+    with the constraint joining each point to the next (-1 between
+    chains); drawing walks it as polylines.
+    """
+
+    def __init__(self, cloth, pairs, groups, chains, max_stretch=40):
+        self.i, self.j = np.array(pairs, dtype=np.intp).reshape(-1, 2).T
+        d = cloth.pos[self.j] - cloth.pos[self.i]
+        self.rest = np.hypot(d[:, 0], d[:, 1])
+        self.broken = np.zeros(len(self.i), dtype=bool)
+        self.groups = [np.array(group, dtype=np.intp) for group in groups]
+        self.chain_points, self.chain_links = (np.array(c, dtype=np.intp) for c in chains)
+        self.max_stretch = max_stretch
+        self._runs = None
+        self.tear_time = 0.0
+
+        # Point -> constraint incidence in CSR form, for cutting.
+        ends = np.concatenate([self.i, self.j])
+        by_point = np.argsort(ends, kind="stable")
+        self._incident = by_point % len(self.i)
+        self._incident_start = np.searchsorted(ends[by_point], np.arange(len(cloth) + 1))
+
+    def __len__(self):
+        return sum(len(group) for group in self.groups)
+
+    def solve(self, cloth):
+        """One sweep over all groups; returns the largest length error seen."""
+        pos = cloth.pos
+        movable = (~cloth.pinned).astype(float)
+        residual = 0.0
+        for k, group in enumerate(self.groups):
+            i, j, rest = self.i[group], self.j[group], self.rest[group]
+            d = pos[j] - pos[i]
+            distance = np.hypot(d[:, 0], d[:, 1])
+            residual = max(residual, np.abs(rest - distance).max(initial=0.0))
+            percent = np.divide(rest - distance, 2 * distance,
+                                out=np.zeros_like(distance), where=distance != 0)
+            offset = d * percent[:, None]
+            mi, mj = movable[i], movable[j]
+            pos[i] -= offset * mi[:, None]
+            pos[j] += offset * mj[:, None]
+
+            # The corrected length follows from the same terms, so tearing
+            # needs no second hypot.
+            start = time.perf_counter()
+            stretched = distance * np.abs(1 + percent * (mi + mj))
+            torn = stretched > rest + self.max_stretch
+            if torn.any():
+                self.tear(k, torn)
+            self.tear_time += time.perf_counter() - start
+        return residual
+
+    def relax(self, cloth, iterations, tolerance=None):
+        """Run solver sweeps and return (sweeps run, last residual).
+
+        With a tolerance, sweeping stops early once no constraint is off
+        its rest length by more than that many pixels; iterations is then
+        only the upper bound.
+        """
+        sweep, residual = 0, 0.0
+        for sweep in range(1, iterations + 1):
+            residual = self.solve(cloth)
+            if tolerance is not None and residual < tolerance:
+                break
+        return sweep, residual
+
+    def tear(self, k, torn):
+        """Mark the masked members of group k broken and compact the group."""
+        group = self.groups[k]
+        self.broken[group[torn]] = True
+        self.groups[k] = group[~torn]
+        self._runs = None
+
+    def touching(self, points):
+        """Live constraints with an end in points."""
+        start, incident = self._incident_start, self._incident
+        ids = np.unique(np.concatenate(
+            [incident[start[p]:start[p + 1]] for p in points] or [np.empty(0, np.intp)]))
+        return ids[~self.broken[ids]]
+
+    def crossing(self, cloth, grid, p0, p1, radius):
+        """Live constraints passing within radius of the path p0-p1."""
+        reach = radius + self.rest.max(initial=0.0) + self.max_stretch
+        ids = self.touching(grid.query_segment(p0, p1, reach))
+        pos = cloth.pos
+        return ids[segment_distance(pos[self.i[ids]], pos[self.j[ids]], p0, p1) <= radius]
+
+    def cut(self, ids):
+        """Break the given constraints."""
+        self.broken[ids] = True
+        self.groups = [group[~self.broken[group]] for group in self.groups]
+        self._runs = None
+
+    def chain_key(self, key=None):
+        """Per chain link: key (default 0), or -1 where the chain is broken."""
+        links = self.chain_links
+        alive = links >= 0
+        alive[alive] = ~self.broken[links[alive]]
+        return np.where(alive, 0 if key is None else key, -1)
+
+    def runs(self):
+        """Unbroken polylines as chain slices, rebuilt only after tears."""
+        if self._runs is None:
+            self._runs = split_runs(self.chain_key())
+        return self._runs
+
+    def stress_bins(self, cloth):
+        """Stress bin of each chain link, from 0 (at rest) to the tear limit."""
+        links = np.maximum(self.chain_links, 0)
+        d = cloth.pos[self.j[links]] - cloth.pos[self.i[links]]
+        rest = self.rest[links]
+        stretch = (np.hypot(d[:, 0], d[:, 1]) - rest) / self.max_stretch
+        return np.clip((stretch * STRESS_BINS).astype(int), 0, STRESS_BINS - 1)
+
+def split_runs(key):
+    """Split a chain into runs of equal key, dropping runs keyed -1.
+
+    Returns (starts, stops, keys): run n covers links starts[n]:stops[n],
+    i.e. chain points starts[n] to stops[n] inclusive.
+    """
+    edges = np.flatnonzero(np.diff(key)) + 1
+    starts = np.concatenate([[0], edges])
+    stops = np.concatenate([edges, [len(key)]])
+    keep = key[starts] >= 0
+    return starts[keep], stops[keep], key[starts[keep]]
+
+def draw_cloth(screen, cloth, constraints, stress_view, hover):
+    """Draw every unbroken row/column run with one pygame.draw.lines call.
+
+    In stress view runs are further split wherever the stress colour
+    changes. Only pinned points and the hovered point get markers.
+    """
+    points = cloth.pos[constraints.chain_points].tolist()
+    if stress_view:
+        runs = split_runs(constraints.chain_key(constraints.stress_bins(cloth)))
+        colors = STRESS_PALETTE
+    else:
+        runs = constraints.runs()
+        colors = [LINK_COLOR]
+    for start, stop, key in zip(*(r.tolist() for r in runs)):
+        pygame.draw.lines(screen, colors[key], False, points[start:stop + 1])
+
+    for x, y in cloth.pos[cloth.pinned].tolist():
+        pygame.draw.circle(screen, (255, 50, 50), (int(x), int(y)), 3)
+    if len(hover):
+        x, y = cloth.pos[hover[0]]
+        pygame.draw.circle(screen, (255, 255, 255), (int(x), int(y)), 4)
+
+def create_cloth(cols=30, rows=20):
+    positions = []
+    pinned = []
     for y in range(rows):
-        row = []
         for x in range(cols):
-            p = Point(x * spacing + 100, y * spacing + 50, pinned=(y == 0 and x % 4 == 0))
-            row.append(p)
-            points.append(p)
+            positions.append((x * spacing + 100, y * spacing + 50))
+            pinned.append(y == 0 and x % 4 == 0)
+    cloth = Cloth(positions, pinned)
+
+    # Colour groups: horizontal links starting on even/odd columns and
+    # vertical links starting on even/odd rows never share a point.
+    pairs = []
+    groups = [[], [], [], []]
+    across = {}
+    down = {}
+    for y in range(rows):
+        for x in range(cols):
+            i = y * cols + x
             if x > 0:
-                constraints.append(Constraint(row[x - 1], row[x]))
+                groups[(x - 1) % 2].append(len(pairs))
+                across[x, y] = len(pairs)
+                pairs.append((i - 1, i))
             if y > 0:
-                constraints.append(Constraint(p, points[(y - 1) * cols + x]))
-    return points, constraints
-
-points, constraints = create_cloth()
-
-dragging = None
-paused = False
-gravity_on = True
-wind_on = False
-
-while True:
-    screen.fill((30, 30, 30))
-    mx, my = pygame.mouse.get_pos()
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit(); sys.exit()
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                paused = not paused
-            elif event.key == pygame.K_r:
-                points, constraints = create_cloth()
-            elif event.key == pygame.K_w:
-                wind_on = not wind_on
-            elif event.key == pygame.K_g:
-                gravity_on = not gravity_on
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:
-                for p in points:
-                    if math.hypot(mx - p.x, my - p.y) < 10:
-                        dragging = p
-                        break
-            elif event.button == 3:
-                for p in points:
-                    if math.hypot(mx - p.x, my - p.y) < 10:
-                        p.pinned = not p.pinned
-        elif event.type == pygame.MOUSEBUTTONUP:
-            dragging = None
-
-    if dragging:
-        dragging.x, dragging.y = mx, my
-
-    if not paused:
-        for p in points:
-            p.update(gravity_on)
-        for _ in range(3):
-            for c in constraints:
-                if not c.broken:
-                    c.solve()
-                    c.tear_if_stretched()
-        if wind_on:
-            for p in points:
-                if not p.pinned:
-                    p.x += random.uniform(-wind_strength, wind_strength)
-                    p.y += random.uniform(-wind_strength, wind_strength)
-        for p in points:
-            p.constrain()
-
-    for c in constraints:
-        if not c.broken:
-            pygame.draw.line(screen, (200, 200, 200), (c.p1.x, c.p1.y), (c.p2.x, c.p2.y), 1)
-
-    for p in points:
-        color = (255, 50, 50) if p.pinned else (255, 255, 255)
-        pygame.draw.circle(screen, color, (int(p.x), int(p.y)), 3)
-
-    pygame.display.flip()
-    clock.tick(60)
+                groups[2 + (y - 1) % 2].append(len(pairs))
+                down[x, y] = len(pairs)
+                pairs.append((i, i - cols))
+
+    chain_points, chain_links = [], []
+    for points, links in (
+            [([y * cols + x for x in range(cols)], [across[x, y] for x in range(1, cols)])
+             for y in range(rows)]
+            + [([y * cols + x for y in range(rows)], [down[x, y] for y in range(1, rows)])
+               for x in range(cols)]):
+        if chain_points:
+            chain_links.append(-1)
+        chain_points += points
+        chain_links += links
+    return cloth, Constraints(cloth, pairs, groups, (chain_points, chain_links))
+
+SETTINGS = ("gravity_on", "wind_on", "substeps", "iterations", "adaptive", "tolerance",
+            "max_stretch", "self_collide")
+
+class Session:
+    """A cloth together with every input that has changed it.
+
+    Anything that affects the physics goes through apply(), which logs it
+    against the number of steps taken so far. Wind draws from a generator
+    seeded with seed, so replaying the log on a fresh Session reproduces
+    the run bit for bit. Inputs given as screen positions (press,
+    toggle_pin, cut) are resolved to point and link indices first, and
+    the indices are what gets logged.
+    """
+
+    def __init__(self, seed=0, cols=30, rows=20):
+        self.seed, self.cols, self.rows = seed, cols, rows
+        self.rng = np.random.default_rng(seed)
+        self.gravity_on = True
+        self.wind_on = False
+        self.substeps = 1
+        self.iterations = 3
+        self.adaptive = False
+        self.tolerance = 0.5
+        self.max_stretch = 40
+        self.self_collide = False
+        self.steps = 0
+        self.log = []
+        self.timings = dict.fromkeys(("integrate", "solve", "tear", "collide", "render"), 0.0)
+        self.sweeps, self.residual = 0, 0.0
+        self.grid = SpatialHash(spacing)
+        self.collision_grid = SpatialHash(SELF_COLLIDE_DISTANCE)
+        self.obstacles = Obstacles()
+        self.reset()
+
+    def reset(self):
+        self.cloth, self.constraints = create_cloth(self.cols, self.rows)
+        self.constraints.max_stretch = self.max_stretch
+        self.dragging = None
+        self.drag_to = None
+        self.grid.build(self.cloth.pos)
+
+    def apply(self, name, *args):
+        self.log.append([self.steps, name, *args])
+        if name == "grab":
+            self.dragging, self.drag_to = args[0], None
+        elif name == "move":
+            if self.dragging is not None:
+                self.drag_to = tuple(args)
+                self.cloth.pos[self.dragging] = self.drag_to
+        elif name == "release":
+            self.dragging = None
+        elif name == "pin":
+            self.cloth.pinned[args[0]] ^= True
+        elif name == "tear":
+            self.constraints.cut(np.array(args[0], dtype=np.intp))
+        elif name == "reset":
+            self.reset()
+        elif name in ("circle", "box", "polyline"):
+            self.obstacles.add(name, *args)
+        elif name == "move_obstacle":
+            self.obstacles.move_to(*args)
+        elif name == "remove_obstacle":
+            self.obstacles.remove(args[0])
+        elif name in SETTINGS:
+            setattr(self, name, args[0])
+            self.constraints.max_stretch = self.max_stretch
+        else:
+            raise ValueError(f"unknown action {name!r}")
+
+    def press(self, x, y):
+        """Grab the point under (x, y), if any."""
+        hits = self.grid.query(x, y, PICK_RADIUS)
+        if len(hits):
+            self.apply("grab", int(hits[0]))
+            self.apply("move", x, y)
+
+    def drag(self, x, y):
+        """Move the grabbed point to (x, y)."""
+        if self.dragging is not None and self.drag_to != (x, y):
+            self.apply("move", x, y)
+
+    def toggle_pin(self, x, y):
+        hits = self.grid.query(x, y, PICK_RADIUS)
+        if len(hits):
+            self.apply("pin", int(hits[0]))
+
+    def cut(self, p0, p1, radius=CUT_RADIUS):
+        ids = self.constraints.crossing(self.cloth, self.grid, p0, p1, radius)
+        if len(ids):
+            self.apply("tear", ids.tolist())
+
+    def step(self):
+        """Advance one fixed physics step, split into substeps."""
+        cloth, constraints, timings = self.cloth, self.constraints, self.timings
+        tear_before = constraints.tear_time
+        iterations = MAX_ITERATIONS if self.adaptive else self.iterations
+        tolerance = self.tolerance if self.adaptive else None
+        self.sweeps = 0
+        for _ in range(self.substeps):
+            start = time.perf_counter()
+            if self.drag_to is not None and self.dragging is not None:
+                cloth.pos[self.dragging] = self.drag_to
+            cloth.update(self.gravity_on, 1 / self.substeps)
+            solve_start = time.perf_counter()
+            sweeps, self.residual = constraints.relax(cloth, iterations, tolerance)
+            solve_end = time.perf_counter()
+            self.sweeps += sweeps
+            cloth.constrain()
+            collide_start = time.perf_counter()
+            self.obstacles.collide(cloth)
+            if self.self_collide:
+                self_collide(cloth, self.collision_grid, self.cols)
+            timings["collide"] += time.perf_counter() - collide_start
+            timings["solve"] += solve_end - solve_start
+            timings["integrate"] += solve_start - start + collide_start - solve_end
+
+        start = time.perf_counter()
+        if self.wind_on:
+            cloth.apply_wind(self.rng)
+            cloth.constrain()
+        self.grid.build(cloth.pos)
+        timings["integrate"] += time.perf_counter() - start
+
+        # Tearing is checked inside the solver sweeps; report it separately.
+        torn = constraints.tear_time - tear_before
+        timings["solve"] -= torn
+        timings["tear"] += torn
+        self.steps += 1
+
+    def checksum(self):
+        state = (self.cloth.pos, self.cloth.old, self.cloth.pinned, self.constraints.broken)
+        return hashlib.sha256(b"".join(a.tobytes() for a in state)).hexdigest()
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"seed": self.seed, "cols": self.cols, "rows": self.rows,
+                       "steps": self.steps, "checksum": self.checksum(),
+                       "actions": self.log}, f)
+
+def default_script(cols, rows, frames):
+    """Drag the bottom middle of the cloth about, with wind, a pin and a cut."""
+    x, y = (cols // 2) * spacing + 100, (rows - 1) * spacing + 50
+    quarter = max(1, frames // 4)
+    script = [{"frame": 0, "press": [x, y]}]
+    script += [{"frame": f, "move": [x + f % 60 * 3, y + f % 40 * 2]} for f in range(1, quarter)]
+    script += [
+        {"frame": quarter, "release": True, "wind_on": True},
+        {"frame": 2 * quarter, "pin": [x, y], "wind_on": False},
+        {"frame": 3 * quarter, "cut": [[100, y / 2], [100 + cols * spacing, y / 2 + 40]]},
+    ]
+    return script
+
+def apply_script_entry(session, entry):
+    """Feed one scripted input, given in screen coordinates, to the session."""
+    for name, value in entry.items():
+        if name == "frame":
+            continue
+        elif name == "press":
+            session.press(*value)
+        elif name == "move":
+            session.drag(*value)
+        elif name == "release":
+            session.apply("release")
+        elif name == "pin":
+            session.toggle_pin(*value)
+        elif name == "cut":
+            session.cut(*value)
+        elif name == "reset":
+            session.apply("reset")
+        elif name in ("circle", "box"):
+            session.apply(name, *value)
+        elif name == "polyline":
+            session.apply(name, value, POLYLINE_THICKNESS)
+        else:
+            session.apply(name, value)
+
+def run_headless(seed=0, cols=30, rows=20, frames=600, script=None, settings=None,
+                 replay=None, record=None, render=True, obstacles=False):
+    """Step the cloth without a window, one physics step per frame.
+
+    Inputs come from script (a list of {"frame": n, action: value} entries),
+    or from a recording when replay is given, in which case the final
+    state is checked against the recorded checksum.
+    """
+    if replay is not None:
+        with open(replay) as f:
+            recording = json.load(f)
+        seed, cols, rows = recording["seed"], recording["cols"], recording["rows"]
+        frames = recording["steps"]
+        actions = recording["actions"]
+    session = Session(seed, cols, rows)
+    if replay is None:
+        for name, value in (settings or {}).items():
+            session.apply(name, value)
+        if obstacles:
+            for kind, *params in obstacle_scene():
+                session.apply(kind, *params)
+        script = default_script(cols, rows, frames) if script is None else script
+        by_frame = {}
+        for entry in script:
+            by_frame.setdefault(entry["frame"], []).append(entry)
+    surface = pygame.Surface((width, height)) if render else None
+
+    next_action = 0
+    start = time.perf_counter()
+    for frame in range(frames + 1):
+        if replay is not None:
+            while next_action < len(actions) and actions[next_action][0] == frame:
+                session.apply(*actions[next_action][1:])
+                next_action += 1
+        else:
+            for entry in by_frame.get(frame, []):
+                apply_script_entry(session, entry)
+        if frame == frames:
+            break
+        session.step()
+        if surface is not None:
+            render_start = time.perf_counter()
+            surface.fill((30, 30, 30))
+            draw_obstacles(surface, session.obstacles)
+            draw_cloth(surface, session.cloth, session.constraints, False, [])
+            session.timings["render"] += time.perf_counter() - render_start
+    elapsed = time.perf_counter() - start
+
+    if record is not None:
+        session.save(record)
+    result = {
+        "seed": seed,
+        "cols": cols,
+        "rows": rows,
+        "frames": frames,
+        "seconds": round(elapsed, 6),
+        "steps_per_sec": round(frames / elapsed, 2) if elapsed else None,
+        "timings": {stage: round(t, 6) for stage, t in session.timings.items()},
+        "links": len(session.constraints),
+        "checksum": session.checksum(),
+    }
+    if replay is not None:
+        result["replay_matches"] = result["checksum"] == recording["checksum"]
+    return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cloth simulator")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window and print timings as JSON")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the wind")
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--frames", type=int, default=600, help="physics steps to run headless")
+    parser.add_argument("--script", help="JSON list of scripted inputs for --headless")
+    parser.add_argument("--substeps", type=int, choices=SUBSTEP_OPTIONS)
+    parser.add_argument("--iterations", type=int)
+    parser.add_argument("--tolerance", type=float, help="iterate adaptively down to this residual")
+    parser.add_argument("--max-stretch", type=float, help="tear threshold in pixels")
+    parser.add_argument("--obstacles", action="store_true", help="start with the obstacle scene")
+    parser.add_argument("--self-collide", action="store_true", help="turn on coarse self-collision")
+    parser.add_argument("--no-render", action="store_true", help="skip drawing when headless")
+    parser.add_argument("--record", help="save the session's inputs to this file on exit")
+    parser.add_argument("--replay", help="replay a recorded session headless and check the result")
+    return parser.parse_args(argv)
+
+def initial_settings(args):
+    settings = {}
+    if args.substeps is not None:
+        settings["substeps"] = args.substeps
+    if args.iterations is not None:
+        settings["iterations"] = args.iterations
+    if args.tolerance is not None:
+        settings["adaptive"] = True
+        settings["tolerance"] = args.tolerance
+    if args.max_stretch is not None:
+        settings["max_stretch"] = args.max_stretch
+    if args.self_collide:
+        settings["self_collide"] = True
+    return settings
+
+def main(args):
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    clock = pygame.time.Clock()
+
+    session = Session(args.seed, args.cols, args.rows)
+    for name, value in initial_settings(args).items():
+        session.apply(name, value)
+    scene = []
+    if args.obstacles:
+        for kind, *params in obstacle_scene():
+            session.apply(kind, *params)
+            scene.append(len(session.obstacles.shapes) - 1)
+    ball = None
+    paused = False
+    cut_mode = False
+    cut_from = None
+    stress_view = False
+    accumulator = 0.0
+    frame_time = PHYSICS_STEP
+
+    while True:
+        screen.fill((30, 30, 30))
+        mx, my = pygame.mouse.get_pos()
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if args.record:
+                    session.save(args.record)
+                pygame.quit(); sys.exit()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_r:
+                    session.apply("reset")
+                elif event.key == pygame.K_w:
+                    session.apply("wind_on", not session.wind_on)
+                elif event.key == pygame.K_g:
+                    session.apply("gravity_on", not session.gravity_on)
+                elif event.key == pygame.K_c:
+                    cut_mode = not cut_mode
+                elif event.key == pygame.K_v:
+                    stress_view = not stress_view
+                elif event.key == pygame.K_x:
+                    session.apply("self_collide", not session.self_collide)
+                elif event.key == pygame.K_o:
+                    if scene:
+                        for shape in scene:
+                            session.apply("remove_obstacle", shape)
+                        scene = []
+                    else:
+                        for kind, *params in obstacle_scene():
+                            session.apply(kind, *params)
+                            scene.append(len(session.obstacles.shapes) - 1)
+                elif event.key == pygame.K_b:
+                    if ball is None:
+                        session.apply("circle", mx, my, BALL_RADIUS)
+                        ball = len(session.obstacles.shapes) - 1
+                    else:
+                        session.apply("remove_obstacle", ball)
+                        ball = None
+                elif event.key == pygame.K_s:
+                    index = SUBSTEP_OPTIONS.index(session.substeps)
+                    session.apply("substeps", SUBSTEP_OPTIONS[(index + 1) % len(SUBSTEP_OPTIONS)])
+                elif event.key == pygame.K_i:
+                    session.apply("adaptive", not session.adaptive)
+                elif event.key in (pygame.K_MINUS, pygame.K_EQUALS):
+                    more = event.key == pygame.K_EQUALS
+                    if session.adaptive:
+                        tolerance = session.tolerance
+                        session.apply("tolerance", tolerance / 2 if more else tolerance * 2)
+                    else:
+                        session.apply("iterations", max(1, session.iterations + (1 if more else -1)))
+                elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                    step = 5 if event.key == pygame.K_RIGHTBRACKET else -5
+                    session.apply("max_stretch", max(5, session.max_stretch + step))
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1 and cut_mode:
+                    cut_from = (mx, my)
+                elif event.button == 1:
+                    session.press(mx, my)
+                elif event.button == 3:
+                    session.toggle_pin(mx, my)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if session.dragging is not None:
+                    session.apply("release")
+                cut_from = None
+
+        if cut_from is not None:
+            session.cut(cut_from, (mx, my))
+            cut_from = (mx, my)
+        session.drag(mx, my)
+        if ball is not None and session.obstacles.shapes[ball][1][:2] != (mx, my):
+            session.apply("move_obstacle", ball, mx, my)
+
+        # Physics runs in fixed steps regardless of the frame rate; after a
+        # stall at most MAX_STEPS_PER_FRAME are run and the rest is dropped.
+        if paused:
+            accumulator = 0.0
+        else:
+            accumulator = min(accumulator + frame_time, MAX_STEPS_PER_FRAME * PHYSICS_STEP)
+            while accumulator >= PHYSICS_STEP:
+                session.step()
+                accumulator -= PHYSICS_STEP
+
+        cloth, constraints = session.cloth, session.constraints
+        draw_obstacles(screen, session.obstacles)
+        hover = session.grid.query(mx, my, PICK_RADIUS) if session.dragging is None else [session.dragging]
+        draw_cloth(screen, cloth, constraints, stress_view, hover[:1])
+
+        if cut_mode:
+            pygame.draw.circle(screen, (255, 200, 0), (mx, my), CUT_RADIUS, 1)
+
+        if session.adaptive:
+            solver = f"adaptive <{session.tolerance:g}px"
+        else:
+            solver = f"{session.iterations} iters"
+        pygame.display.set_caption(
+            f"Cloth - {session.substeps} substeps, {solver}: {session.sweeps} sweeps, "
+            f"residual {session.residual:.2f}px - tear at +{session.max_stretch:g}px - "
+            f"{len(constraints)} links" + (" - cut" if cut_mode else "")
+            + (" - self-collision" if session.self_collide else ""))
+        pygame.display.flip()
+        frame_time = clock.tick(60) / 1000
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.headless or args.replay:
+        script = None
+        if args.script:
+            with open(args.script) as f:
+                script = json.load(f)
+        print(json.dumps(run_headless(args.seed, args.cols, args.rows, args.frames, script,
+                                      initial_settings(args), args.replay, args.record,
+                                      not args.no_render, args.obstacles)))
+    else:
+        main(args)
@@ -1,15 +1,32 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
 import pygame
 import numpy as np
+import argparse
+import json
+import mmap
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque, namedtuple
+from functools import lru_cache
+import multiprocessing as mp
+from multiprocessing import shared_memory
 
-pygame.init()
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 ROWS, COLS = 50, 50
 button_height = 50
 fullscreen = False
 screen_width, screen_height = 800, 850
 
-screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
-pygame.display.set_caption("Conway's Game of Life")
+screen = None
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -22,117 +39,127 @@ GREEN = (0, 200, 0)
 framerates = [1, 5, 10, 15, 30]
 current_framerate_index = 1 
 
-grid = np.zeros((ROWS, COLS), dtype=int)
-
-def place_glider(grid, r, c):
-    for dr, dc in [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_blinker(grid, r, c):
-    for dr, dc in [(0, 0), (0, 1), (0, 2)]:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_gosper_gun(grid, r, c):
-    coords = [
-        (5, 1), (5, 2), (6, 1), (6, 2),
-        (5, 11), (6, 11), (7, 11), (4, 12), (8, 12),
-        (3, 13), (9, 13), (3, 14), (9, 14), (6, 15),
-        (4, 16), (8, 16), (5, 17), (6, 17), (7, 17), (6, 18),
-        (3, 21), (4, 21), (5, 21), (3, 22), (4, 22), (5, 22),
-        (2, 23), (6, 23), (1, 25), (2, 25), (6, 25), (7, 25),
-        (3, 35), (4, 35), (3, 36), (4, 36)
-    ]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_toad(grid, r, c):
-    coords = [(0,1), (0,2), (0,3), (1,0), (1,1), (1,2)]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_beacon(grid, r, c):
-    coords = [(0,0), (0,1), (1,0), (1,1), (2,2), (2,3), (3,2), (3,3)]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_pulsar(grid, r, c):
-    base = [
-        (2,4), (2,5), (2,6), (2,10), (2,11), (2,12),
-        (7,4), (7,5), (7,6), (7,10), (7,11), (7,12),
-        (4,2), (5,2), (6,2), (10,2), (11,2), (12,2),
-        (4,7), (5,7), (6,7), (10,7), (11,7), (12,7),
-        (4,9), (5,9), (6,9), (10,9), (11,9), (12,9),
-        (4,14), (5,14), (6,14), (10,14), (11,14), (12,14),
-        (14,4), (14,5), (14,6), (14,10), (14,11), (14,12),
-        (9,2), (9,7), (9,9), (9,14)
-    ]
-    for dr, dc in base:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_lwss(grid, r, c):
-    coords = [(0,1), (0,4), (1,0), (2,0), (3,0), (3,4), (4,0), (4,1), (4,2), (4,3)]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-            
-def place_and_gate(grid, r, c):
-    coords = [
-        (0, 0), (0, 1), (1, 0), (1, 1), 
-        (4, 4), (4, 5), (5, 4), (5, 5),  
-        (2, 10), (3, 11), (4, 9), (4, 10), (4, 11)  
-    ]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_or_gate(grid, r, c):
-    coords = [
-        (0, 0), (0, 1), (1, 0), (1, 1),
-        (0, 8), (1, 8), (1, 9), (2, 9),
-        (3, 11), (4, 11), (4, 12), (5, 12)  
-    ]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
-
-def place_not_gate(grid, r, c):
-    coords = [
-        (0, 0), (0, 1), (1, 0), (1, 1),  
-        (4, 3), (5, 4), (6, 2), (6, 3), (6, 4)  
-    ]
-    for dr, dc in coords:
-        if 0 <= r + dr < ROWS and 0 <= c + dc < COLS:
-            grid[r + dr][c + dc] = 1
+# Simulation speed in generations per second; None runs as fast as possible.
+generation_rates = [1, 5, 10, 30, 60, 240, 1000, None]
+current_generation_rate_index = 1
+measured_rate = 0.0
 
+grid = np.zeros((ROWS, COLS), dtype=np.uint8)
 
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns")
+PRESET_ORDER = ["Glider", "Blinker", "Gosper Gun", "Toad", "Beacon", "Pulsar",
+                "LWSS", "AND Gate", "OR Gate", "NOT Gate"]
+
+def read_pattern_name(path):
+    """Return the name declared in a pattern file's header, if any."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#N"):
+                return line[2:].strip()
+            if line.lower().startswith("!name:"):
+                return line[6:].strip()
+            if line and not line.startswith(("#", "!")):
+                break
+    return None
+
+@lru_cache(maxsize=None)
+def pattern_index(directory=PATTERN_DIR):
+    """Map pattern names to .rle/.cells files, reading only their headers."""
+    index = {}
+    if not os.path.isdir(directory):
+        return index
+    for filename in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() in (".rle", ".cells"):
+            path = os.path.join(directory, filename)
+            index[read_pattern_name(path) or stem] = path
+    return index
+
+def parse_rle(text):
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    header = dict(part.replace(" ", "").split("=", 1) for part in lines[0].split(","))
+    mask = np.zeros((int(header["y"]), int(header["x"])), dtype=np.uint8)
+
+    row = col = 0
+    count = ""
+    for ch in "".join(lines[1:]):
+        if ch.isdigit():
+            count += ch
+            continue
+        if ch.isspace():
+            continue
+        n = int(count or 1)
+        count = ""
+        if ch == "!":
+            break
+        elif ch == "$":
+            row, col = row + n, 0
+        elif ch in "b.":
+            col += n
+        else:
+            if row >= mask.shape[0] or col + n > mask.shape[1]:
+                raise ValueError("RLE pattern data exceeds its x/y header")
+            mask[row, col:col + n] = 1
+            col += n
+    return mask
+
+def parse_cells(text):
+    rows = [line.rstrip() for line in text.splitlines() if not line.startswith("!")]
+    mask = np.zeros((len(rows), max((len(r) for r in rows), default=0)), dtype=np.uint8)
+    for r, line in enumerate(rows):
+        mask[r, :len(line)] = [ch not in ". " for ch in line]
+    return mask
+
+@lru_cache(maxsize=None)
+def load_pattern(name):
+    """Parse a pattern from the library into a 0/1 mask on first use."""
+    path = pattern_index()[name]
+    with open(path) as f:
+        text = f.read()
+    return parse_rle(text) if path.lower().endswith(".rle") else parse_cells(text)
+
+def stamp(grid, mask, r, c):
+    h = min(mask.shape[0], grid.shape[0] - r)
+    w = min(mask.shape[1], grid.shape[1] - c)
+    if h > 0 and w > 0:
+        grid[r:r + h, c:c + w] |= mask[:h, :w]
+
+def make_placer(name):
+    def place(grid, r, c):
+        stamp(grid, load_pattern(name), r, c)
+    return place
+
+def preset_names():
+    names = pattern_index()
+    ordered = [name for name in PRESET_ORDER if name in names]
+    return ordered + sorted(name for name in names if name not in PRESET_ORDER)
 
 presets = {
     "Start/Stop": None,
     "Reset": None,
     "Framerate": None,
-    "Glider": place_glider,
-    "Blinker": place_blinker,
-    "Gosper Gun": place_gosper_gun,
-    "Toad": place_toad,
-    "Beacon": place_beacon,
-    "Pulsar": place_pulsar,
-    "LWSS": place_lwss,
-    "AND Gate": place_and_gate,
-    "OR Gate": place_or_gate,
-    "NOT Gate": place_not_gate,
+    "Gen/s": None,
 }
+presets.update((name, make_placer(name)) for name in preset_names())
+
+# Buttons narrower than this are left off the end of the bar.
+MIN_BUTTON_WIDTH = 40
+
+def visible_buttons():
+    return list(presets)[:max(1, screen_width // MIN_BUTTON_WIDTH)]
+
+def button_at(x):
+    """Name of the button under window column x."""
+    names = visible_buttons()
+    index = ((x + 1) * len(names) - 1) // max(screen_width, 1)
+    return names[max(0, min(index, len(names) - 1))]
 
 
 
 selected_preset = None
 running_sim = False
-clock = pygame.time.Clock()
 
 def toggle_fullscreen():
     global fullscreen, screen, screen_width, screen_height
@@ -144,98 +171,1126 @@ def toggle_fullscreen():
         screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
     screen_width, screen_height = screen.get_size()
 
-def draw(win, grid):
-    cell_w = screen_width // COLS
-    cell_h = (screen_height - button_height) // ROWS
+class GridLayout:
+    """Pixel-to-cell maps and grid-line gap masks for one window size.
 
-    win.fill(BLACK)
+    When cells are at least one pixel wide each cell covers cell_w x cell_h
+    pixels and the last pixel column and row of a cell are left as a black
+    gap. Boards with more cells than pixels are sampled down instead.
+    """
+
+    def __init__(self, width, height, rows, cols):
+        self.key = (width, height, rows, cols)
+        board_h = height - button_height
+        self.cell_w, self.cell_h = width // cols, board_h // rows
+        self.col_of_x, self.gap_x = self._axis_map(width, cols, self.cell_w)
+        self.row_of_y, self.gap_y = self._axis_map(board_h, rows, self.cell_h)
+        self.surface = pygame.Surface((len(self.col_of_x), len(self.row_of_y)), 0, 32)
+        self.palette = np.array([self.surface.map_rgb(c) for c in (GRAY, WHITE, BLACK)], dtype=np.uint32)
+
+    @staticmethod
+    def _axis_map(pixels, cells, cell):
+        if cell >= 1:
+            px = np.arange(cells * cell)
+            return px // cell, (px % cell == cell - 1) if cell > 1 else np.zeros(len(px), dtype=bool)
+        px = np.arange(max(pixels, 0))
+        return px * cells // max(pixels, 1), np.zeros(len(px), dtype=bool)
+
+    def cell_at(self, x, y):
+        y -= button_height
+        if 0 <= x < len(self.col_of_x) and 0 <= y < len(self.row_of_y):
+            return int(self.row_of_y[y]), int(self.col_of_x[x])
+        return None
+
+    def pixel_span(self, r0, r1, c0, c1):
+        x0, x1 = np.searchsorted(self.col_of_x, (c0, c1))
+        y0, y1 = np.searchsorted(self.row_of_y, (r0, r1))
+        return int(x0), int(x1), int(y0), int(y1)
+
+layout = None
+button_bar = None
+button_bar_key = None
+font = None
+
+def get_layout():
+    global layout
+    if layout is None or layout.key != (screen_width, screen_height, ROWS, COLS):
+        layout = GridLayout(screen_width, screen_height, ROWS, COLS)
+    return layout
 
-    bw = screen_width // len(presets)
-    for i, name in enumerate(presets):
-        rect = pygame.Rect(i * bw, 0, bw, button_height)
+def button_bar_state():
+    return (screen_width, running_sim, selected_preset, current_framerate_index,
+            current_generation_rate_index, round(measured_rate))
+
+def render_button_bar():
+    global button_bar, button_bar_key, font
+    key = button_bar_state()
+    if key == button_bar_key:
+        return button_bar
+
+    if font is None:
+        font = pygame.font.SysFont(None, 24)
+    button_bar = pygame.Surface((screen_width, button_height))
+    names = visible_buttons()
+    for i, name in enumerate(names):
+        # Spread the remainder pixels so the buttons fill the whole bar.
+        left, right = i * screen_width // len(names), (i + 1) * screen_width // len(names)
+        rect = pygame.Rect(left, 0, right - left, button_height)
         color = RED if name == "Reset" else GREEN if name == "Start/Stop" and running_sim else BLUE
         if selected_preset == name:
             color = YELLOW
-        pygame.draw.rect(win, color, rect)
-        font = pygame.font.SysFont(None, 24)
-        label = f"{name} ({framerates[current_framerate_index]}fps)" if name == "Framerate" else name
+        pygame.draw.rect(button_bar, color, rect)
+        label = name
+        if name == "Framerate":
+            label = f"{name} ({framerates[current_framerate_index]}fps)"
+        elif name == "Gen/s":
+            rate = generation_rates[current_generation_rate_index]
+            label = f"{name} ({rate or 'max'}) {measured_rate:.0f}"
         text = font.render(label, True, BLACK)
-        win.blit(text, text.get_rect(center=rect.center))
-
-
-    for row in range(ROWS):
-        for col in range(COLS):
-            color = WHITE if grid[row][col] == 1 else GRAY
-            pygame.draw.rect(
-                win,
-                color,
-                pygame.Rect(
-                    col * cell_w,
-                    row * cell_h + button_height,
-                    cell_w - 1,
-                    cell_h - 1
-                )
-            )
+        button_bar.blit(text, text.get_rect(center=rect.center))
+    button_bar_key = key
+    return button_bar
+
+def draw(win, grid):
+    win.fill(BLACK)
+    win.blit(render_button_bar(), (0, 0))
+    draw_cells(win, grid, 0, ROWS, 0, COLS)
     pygame.display.flip()
 
-def get_neighbors(grid, row, col):
-    return sum(grid[(row + dr) % ROWS][(col + dc) % COLS]
-               for dr in (-1, 0, 1) for dc in (-1, 0, 1)
-               if not (dr == 0 and dc == 0))
+def draw_cells(win, grid, r0, r1, c0, c1):
+    lay = get_layout()
+    x0, x1, y0, y1 = lay.pixel_span(r0, r1, c0, c1)
+    # Gather only the cells under the span. Surface arrays are indexed
+    # [x, y], and palette entry 2 paints the grid-line gaps.
+    block = grid[r0:r1, c0:c1].T
+    cells = block.take(lay.col_of_x[x0:x1] - c0, axis=0).take(lay.row_of_y[y0:y1] - r0, axis=1)
+    cells[lay.gap_x[x0:x1]] = 2
+    cells[:, lay.gap_y[y0:y1]] = 2
+    pixels = pygame.surfarray.pixels2d(lay.surface)
+    pixels[x0:x1, y0:y1] = lay.palette.take(cells)
+    del pixels
+    rect = pygame.Rect(x0, y0, x1 - x0, y1 - y0)
+    win.blit(lay.surface, (x0, y0 + button_height), rect)
+    return rect.move(0, button_height)
+
+def draw_tiles(win, grid, tiles):
+    rects = [draw_cells(win, grid, r0, r1, c0, c1) for r0, r1, c0, c1 in tiles]
+    if button_bar_state() != button_bar_key:
+        rects.append(win.blit(render_button_bar(), (0, 0)))
+    pygame.display.update(rects)
+
+def count_neighbors(grid):
+    rows = grid + np.roll(grid, 1, axis=0) + np.roll(grid, -1, axis=0)
+    return rows + np.roll(rows, 1, axis=1) + np.roll(rows, -1, axis=1) - grid
+
+def count_neighbors_padded(block):
+    """Neighbour counts for the interior of a block carrying a one-cell halo."""
+    rows = block[:-2] + block[1:-1] + block[2:]
+    return rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:] - block[1:-1, 1:-1]
+
+def apply_rule(grid, n):
+    return ((n == 3) | ((n == 2) & (grid == 1))).astype(np.uint8)
 
 def update(grid):
-    new_grid = np.copy(grid)
-    for r in range(ROWS):
-        for c in range(COLS):
-            n = get_neighbors(grid, r, c)
-            if grid[r][c] == 1 and (n < 2 or n > 3):
-                new_grid[r][c] = 0
-            elif grid[r][c] == 0 and n == 3:
-                new_grid[r][c] = 1
-    return new_grid
-
-running = True
-while running:
-    clock.tick(framerates[current_framerate_index])
-    cell_w = screen_width // COLS
-    cell_h = (screen_height - button_height) // ROWS
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_f:
-                toggle_fullscreen()
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            x, y = pygame.mouse.get_pos()
-
-            if y < button_height:
-                idx = x // (screen_width // len(presets))
-                btn_name = list(presets.keys())[idx]
-                if btn_name == "Start/Stop":
-                    running_sim = not running_sim
-                elif btn_name == "Reset":
-                    grid = np.zeros((ROWS, COLS), dtype=int)
-                    running_sim = False
-                    selected_preset = None 
-                elif btn_name == "Framerate":
-                    current_framerate_index = (current_framerate_index + 1) % len(framerates)
-                else:
-                    selected_preset = btn_name
+    return apply_rule(grid, count_neighbors(grid))
+
+WORD_BITS = 64
+ONE = np.uint64(1)
+
+class PackedLife:
+    """Toroidal board stored as rows of uint64 words, 64 cells per word.
+
+    Bit i of word w in a row holds column w * 64 + i. Columns past the
+    right edge of the board are padding and are always kept at zero.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.shape = (rows, cols)
+        self.tail = cols % WORD_BITS
+        n_words = -(-cols // WORD_BITS)
+        self.words = np.zeros((rows, n_words), dtype=np.uint64)
+        self.mask = np.full(n_words, ~np.uint64(0), dtype=np.uint64)
+        if self.tail:
+            self.mask[-1] = (ONE << np.uint64(self.tail)) - ONE
+
+    @classmethod
+    def from_grid(cls, grid):
+        board = cls(*grid.shape)
+        board.load(grid)
+        return board
+
+    def load(self, grid):
+        padded = np.zeros((self.rows, self.words.shape[1] * WORD_BITS), dtype=np.uint8)
+        padded[:, :self.cols] = grid
+        packed = np.packbits(padded, axis=1, bitorder="little")
+        self.words = packed.view("<u8").astype(np.uint64)
+
+    def to_grid(self):
+        raw = self.words.astype("<u8").view(np.uint8)
+        return np.unpackbits(raw, axis=1, bitorder="little")[:, :self.cols]
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            self.words = self._next(self.words)
+
+    def _west(self, x):
+        # Each cell receives the value of its left-hand neighbour.
+        west = (x << ONE) | (np.roll(x, 1, axis=1) >> np.uint64(WORD_BITS - 1))
+        if self.tail:
+            west[:, 0] |= (x[:, -1] >> np.uint64(self.tail - 1)) & ONE
+        return west
+
+    def _east(self, x):
+        # Each cell receives the value of its right-hand neighbour.
+        east = (x >> ONE) | (np.roll(x, -1, axis=1) << np.uint64(WORD_BITS - 1))
+        if self.tail:
+            east[:, -1] |= (x[:, 0] & ONE) << np.uint64(self.tail - 1)
+        return east
+
+    def _next(self, x):
+        w, e = self._west(x), self._east(x)
+
+        # Two-bit sums of each horizontal triple (with the centre cell)
+        # and of the left/right pair (without it).
+        h0 = w ^ x ^ e
+        h1 = (w & x) | (e & (w ^ x))
+        s0 = w ^ e
+        s1 = w & e
+
+        a0, a1 = np.roll(h0, 1, axis=0), np.roll(h1, 1, axis=0)
+        b0, b1 = np.roll(h0, -1, axis=0), np.roll(h1, -1, axis=0)
+
+        # Full adders: bit0 of the neighbour count, its carry, then bit1
+        # and a flag for counts of four or more.
+        bit0 = a0 ^ b0 ^ s0
+        carry = (a0 & b0) | (s0 & (a0 ^ b0))
+        p, q = a1 ^ b1, a1 & b1
+        u, v = s1 ^ carry, s1 & carry
+        bit1 = p ^ u
+        high = q | v | (p & u)
+
+        return bit1 & ~high & (bit0 | x) & self.mask
+
+HASHLIFE_CACHE_SIZE = 1 << 20
+
+class Node(namedtuple("Node", "k a b c d n hash")):
+    """Quadtree node of side 2**k with quadrants a (NW), b (NE), c (SW), d (SE)."""
+    __slots__ = ()
+
+    def __hash__(self):
+        return self.hash
+
+ON = Node(0, None, None, None, None, 1, 1)
+OFF = Node(0, None, None, None, None, 0, 0)
+
+@lru_cache(maxsize=HASHLIFE_CACHE_SIZE)
+def join(a, b, c, d):
+    return Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n,
+                hash((a.k + 1, a.hash, b.hash, c.hash, d.hash)))
+
+@lru_cache(maxsize=None)
+def get_zero(k):
+    return OFF if k == 0 else join(*[get_zero(k - 1)] * 4)
+
+def centre(m):
+    z = get_zero(m.k - 1)
+    return join(join(z, z, z, m.a), join(z, z, m.b, z),
+                join(z, m.c, z, z), join(m.d, z, z, z))
+
+def life(a, b, c, d, e, f, g, h, i):
+    outer = a.n + b.n + c.n + d.n + f.n + g.n + h.n + i.n
+    return ON if outer == 3 or (e.n and outer == 2) else OFF
+
+def life_4x4(m):
+    ad = life(m.a.a, m.a.b, m.b.a, m.a.c, m.a.d, m.b.c, m.c.a, m.c.b, m.d.a)
+    bc = life(m.a.b, m.b.a, m.b.b, m.a.d, m.b.c, m.b.d, m.c.b, m.d.a, m.d.b)
+    cb = life(m.a.c, m.a.d, m.b.c, m.c.a, m.c.b, m.d.a, m.c.c, m.c.d, m.d.c)
+    da = life(m.a.d, m.b.c, m.b.d, m.c.b, m.d.a, m.d.b, m.c.d, m.d.c, m.d.d)
+    return join(ad, bc, cb, da)
+
+@lru_cache(maxsize=HASHLIFE_CACHE_SIZE)
+def successor(m, j):
+    """Centre of node m (level k-1) advanced 2**j generations, j <= k - 2."""
+    if m.n == 0:
+        return m.a
+    if m.k == 2:
+        return life_4x4(m)
+
+    c1 = successor(m.a, j)
+    c2 = successor(join(m.a.b, m.b.a, m.a.d, m.b.c), j)
+    c3 = successor(m.b, j)
+    c4 = successor(join(m.a.c, m.a.d, m.c.a, m.c.b), j)
+    c5 = successor(join(m.a.d, m.b.c, m.c.b, m.d.a), j)
+    c6 = successor(join(m.b.c, m.b.d, m.d.a, m.d.b), j)
+    c7 = successor(m.c, j)
+    c8 = successor(join(m.c.b, m.d.a, m.c.d, m.d.c), j)
+    c9 = successor(m.d, j)
+
+    if j < m.k - 2:
+        return join(join(c1.d, c2.c, c4.b, c5.a), join(c2.d, c3.c, c5.b, c6.a),
+                    join(c4.d, c5.c, c7.b, c8.a), join(c5.d, c6.c, c8.b, c9.a))
+    return join(successor(join(c1, c2, c4, c5), j), successor(join(c2, c3, c5, c6), j),
+                successor(join(c4, c5, c7, c8), j), successor(join(c5, c6, c8, c9), j))
+
+def set_cell(node, row, col, alive):
+    if node.k == 0:
+        return ON if alive else OFF
+    half = 1 << (node.k - 1)
+    a, b, c, d = node.a, node.b, node.c, node.d
+    if row < half and col < half:
+        a = set_cell(a, row, col, alive)
+    elif row < half:
+        b = set_cell(b, row, col - half, alive)
+    elif col < half:
+        c = set_cell(c, row - half, col, alive)
+    else:
+        d = set_cell(d, row - half, col - half, alive)
+    return join(a, b, c, d)
+
+class HashLifeUniverse:
+    """Unbounded Life plane stored as a memoized quadtree.
+
+    The root node covers rows [top, top + 2**k) and columns
+    [left, left + 2**k) of the plane and grows as the pattern spreads.
+    """
+
+    def __init__(self):
+        self.root = get_zero(3)
+        self.top = self.left = -(1 << 2)
+        self.generation = 0
+
+    @classmethod
+    def from_grid(cls, grid, top=0, left=0):
+        universe = cls()
+        universe.set_window(top, left, grid)
+        return universe
+
+    @property
+    def population(self):
+        return self.root.n
+
+    def _expand(self):
+        half = 1 << (self.root.k - 1)
+        self.root = centre(self.root)
+        self.top -= half
+        self.left -= half
+
+    def _is_padded(self):
+        m = self.root
+        return m.a.d.d.n + m.b.c.c.n + m.c.b.b.n + m.d.a.a.n == m.n
+
+    def step(self, exponent=0):
+        """Advance the plane by 2**exponent generations at once."""
+        while self.root.k < exponent + 2 or not self._is_padded():
+            self._expand()
+        self.root = successor(centre(self.root), exponent)
+        self.generation += 1 << exponent
+
+    def set_window(self, top, left, grid):
+        rows, cols = grid.shape
+        while (top < self.top or left < self.left
+               or top + rows > self.top + (1 << self.root.k)
+               or left + cols > self.left + (1 << self.root.k)):
+            self._expand()
+        current = self.window(top, left, rows, cols)
+        for r, c in zip(*np.nonzero(current != grid)):
+            self.root = set_cell(self.root, top + r - self.top, left + c - self.left, grid[r, c])
+
+    def window(self, top, left, rows, cols):
+        out = np.zeros((rows, cols), dtype=np.uint8)
+        stack = [(self.root, self.top, self.left)]
+        while stack:
+            node, r, c = stack.pop()
+            size = 1 << node.k
+            if (node.n == 0 or r >= top + rows or c >= left + cols
+                    or r + size <= top or c + size <= left):
+                continue
+            if node.k == 0:
+                out[r - top, c - left] = 1
+                continue
+            half = size >> 1
+            stack += [(node.a, r, c), (node.b, r, c + half),
+                      (node.c, r + half, c), (node.d, r + half, c + half)]
+        return out
+
+TILE_SIZE = 16
+
+class TiledLife:
+    """Toroidal board that only recomputes tiles near last generation's changes.
+
+    The grid is updated in place. A tile is active when it or one of its
+    eight neighbouring tiles changed in the previous generation; every
+    other tile is known to be unchanged and is skipped.
+    """
+
+    def __init__(self, grid, tile_size=TILE_SIZE):
+        self.grid = grid
+        self.tile_size = tile_size
+        rows, cols = grid.shape
+        self.active = np.ones((-(-rows // tile_size), -(-cols // tile_size)), dtype=bool)
+        self.changed = []
+
+    def activate_all(self):
+        self.active[:] = True
+
+    def step(self):
+        """Advance one generation and return the changed tiles as (r0, r1, c0, c1)."""
+        rows, cols = self.grid.shape
+        t = self.tile_size
+        updates = []
+        for tr, tc in zip(*np.nonzero(self.active)):
+            r0, c0 = tr * t, tc * t
+            r1, c1 = min(r0 + t, rows), min(c0 + t, cols)
+            block = self.grid[np.ix_(np.arange(r0 - 1, r1 + 1) % rows,
+                                     np.arange(c0 - 1, c1 + 1) % cols)]
+            current = block[1:-1, 1:-1]
+            nxt = apply_rule(current, count_neighbors_padded(block))
+            if not np.array_equal(nxt, current):
+                updates.append((tr, tc, nxt))
 
+        changed = np.zeros_like(self.active)
+        self.changed = []
+        for tr, tc, nxt in updates:
+            r0, c0 = tr * t, tc * t
+            r1, c1 = r0 + nxt.shape[0], c0 + nxt.shape[1]
+            self.grid[r0:r1, c0:c1] = nxt
+            changed[tr, tc] = True
+            self.changed.append((r0, r1, c0, c1))
+
+        self.active = changed.copy()
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                self.active |= np.roll(changed, (dr, dc), axis=(0, 1))
+        return self.changed
+
+tiled = None
+
+def update_tiled(grid):
+    global tiled
+    if tiled is None or tiled.grid is not grid:
+        tiled = TiledLife(grid)
+    tiled.step()
+    return grid
+
+def _strip_worker(names, shape, lo, hi, command, sync, step_barrier):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    grids = [np.ndarray(shape, dtype=np.uint8, buffer=b.buf) for b in buffers]
+    halo_rows = np.arange(lo - 1, hi + 1) % shape[0]
+    phase = 0
+    while True:
+        sync.wait()
+        generations = command.value
+        if generations < 0:
+            break
+        for _ in range(generations):
+            strip = grids[phase][halo_rows]
+            block = np.concatenate((strip[:, -1:], strip, strip[:, :1]), axis=1)
+            grids[1 - phase][lo:hi] = apply_rule(block[1:-1, 1:-1], count_neighbors_padded(block))
+            step_barrier.wait()
+            phase ^= 1
+        sync.wait()
+    # strip and block are copies; only grids holds views of the buffers.
+    del grids
+    for b in buffers:
+        b.close()
+
+class ParallelLife:
+    """Toroidal board split into horizontal strips, one worker process per strip.
+
+    The board lives in two shared-memory buffers, the current generation and
+    the next. Each generation every worker reads its strip plus the halo row
+    above and below, which belong to the neighbouring strips and wrap from
+    the last strip to the first. It then writes its rows of the next
+    generation into the other buffer. A barrier keeps the workers in step.
+    """
+
+    def __init__(self, grid, workers=None):
+        self.shape = grid.shape
+        workers = max(1, min(workers or os.cpu_count() or 1, self.shape[0]))
+        self.buffers = [shared_memory.SharedMemory(create=True, size=max(grid.size, 1)) for _ in range(2)]
+        self.grids = [np.ndarray(self.shape, dtype=np.uint8, buffer=b.buf) for b in self.buffers]
+        self.phase = 0
+        self.load(grid)
+
+        ctx = mp.get_context()
+        self.command = ctx.Value("q", 0, lock=False)
+        self.sync = ctx.Barrier(workers + 1)
+        self.step_barrier = ctx.Barrier(workers)
+        names = [b.name for b in self.buffers]
+        bounds = np.linspace(0, self.shape[0], workers + 1).astype(int)
+        self.workers = [
+            ctx.Process(target=_strip_worker, daemon=True,
+                        args=(names, self.shape, lo, hi, self.command, self.sync, self.step_barrier))
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def load(self, grid):
+        self.grids[self.phase][:] = grid
+
+    def to_grid(self):
+        return self.grids[self.phase].copy()
+
+    def step(self, generations=1):
+        self.command.value = generations
+        self.sync.wait()
+        self.sync.wait()
+        self.phase = (self.phase + generations) % 2
+
+    def close(self):
+        if not self.workers:
+            return
+        self.command.value = -1
+        self.sync.wait()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        del self.grids
+        for b in self.buffers:
+            b.close()
+            b.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+engines = {
+    "NumPy": update,
+    "Bit-packed": None,
+    "HashLife": None,
+    "Tiled": update_tiled,
+    "Parallel": None,
+}
+current_engine = "NumPy"
+universe = None
+
+# Engines that keep the board in their own format between steps. grid only
+# catches up when it is drawn or edited, and edits reload the board.
+parallel_workers = None
+board_engines = {
+    "Bit-packed": PackedLife.from_grid,
+    "Parallel": lambda grid: ParallelLife(grid, parallel_workers),
+}
+boards = {}
+board_synced = None  # engine whose board holds the same generation as grid
+grid_behind = False  # that board has run ahead of grid
+view_row, view_col = 0, 0
+hashlife_exponent = 0
+
+class CycleDetector:
+    """Spots still lifes and oscillators from a bounded history of board hashes.
+
+    Each generation is bit-packed and hashed. When a hash comes back, the
+    stored frame is compared exactly; on a match the board has entered a
+    cycle, and its frames are replayed instead of recomputed. The history
+    holds at most max_period frames and at most max_bytes of packed data.
+    """
+
+    def __init__(self, max_period=1024, max_bytes=64 << 20):
+        self.max_period = max_period
+        self.max_bytes = max_bytes
+        self.reset()
+
+    def reset(self, grid=None):
+        self.frames = deque()
+        self.seen = {}
+        self.generation = 0
+        self.period = self.start = None
+        self.cycle = []
+        if grid is not None:
+            self.shape = grid.shape
+            self._record(grid)
+
+    def _record(self, grid):
+        packed = np.packbits(grid).tobytes()
+        key = hash(packed)
+        limit = min(self.max_period, max(2, self.max_bytes // max(len(packed), 1)))
+        while len(self.frames) >= limit:
+            old_gen, old_key, _ = self.frames.popleft()
+            if self.seen.get(old_key) == old_gen:
+                del self.seen[old_key]
+        prev = self.seen.get(key)
+        if prev is not None:
+            first = self.frames[0][0]
+            if self.frames[prev - first][2] == packed:
+                self.start, self.period = prev, self.generation - prev
+                self.cycle = [frame for _, _, frame in list(self.frames)[prev - first:]]
+        self.frames.append((self.generation, key, packed))
+        self.seen[key] = self.generation
+
+    def observe(self, grid):
+        """Record the next generation; return True once the board is known to cycle."""
+        self.generation += 1
+        self._record(grid)
+        return self.period is not None
+
+    def replay(self):
+        """Return the next generation from the cached cycle without computing it."""
+        self.generation += 1
+        frame = self.cycle[(self.generation - self.start) % self.period]
+        cells = np.unpackbits(np.frombuffer(frame, dtype=np.uint8), count=self.shape[0] * self.shape[1])
+        return cells.reshape(self.shape)
+
+HISTORY_KEYFRAME_INTERVAL = 64
+
+class HistoryRecorder:
+    """Append-only on-disk record of every generation, read back through mmap.
+
+    Every keyframe_interval-th generation is stored as a bit-packed
+    keyframe. The others are stored as zlib-compressed XOR deltas against
+    the previous generation. A fixed-width index file holds each record's
+    offset and length, so any generation is rebuilt from one keyframe seek
+    plus at most keyframe_interval - 1 deltas. Only the last generation is
+    kept in memory, so long runs do not grow the process.
+    """
+
+    INDEX_RECORD = struct.Struct("<QI")
+
+    def __init__(self, shape, path=None, keyframe_interval=HISTORY_KEYFRAME_INTERVAL):
+        self.shape = shape
+        self.keyframe_interval = keyframe_interval
+        self.temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="life-history-", suffix=".bin")
+            os.close(fd)
+        self.path = path
+        self.data = open(path, "w+b")
+        self.index = open(path + ".idx", "w+b")
+        self.data_map = self.index_map = None
+        self.count = 0
+        self.last = None
+
+    def __len__(self):
+        return self.count
+
+    def reset(self, grid):
+        self.truncate(0)
+        self.append(grid)
+
+    def append(self, grid):
+        packed = np.packbits(grid)
+        if self.count % self.keyframe_interval == 0:
+            payload = packed.tobytes()
+        else:
+            payload = zlib.compress((packed ^ self.last).tobytes(), 1)
+        self.data.seek(0, os.SEEK_END)
+        offset = self.data.tell()
+        self.data.write(payload)
+        self.index.seek(self.count * self.INDEX_RECORD.size)
+        self.index.write(self.INDEX_RECORD.pack(offset, len(payload)))
+        self.last = packed
+        self.count += 1
+
+    def _maps(self):
+        # Remap only when the files have grown past what is already mapped.
+        self.data.flush()
+        self.index.flush()
+        if self.index_map is None or len(self.index_map) < self.count * self.INDEX_RECORD.size:
+            self._unmap()
+            self.data_map = mmap.mmap(self.data.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index_map = mmap.mmap(self.index.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.data_map, self.index_map
+
+    def _unmap(self):
+        for m in (self.data_map, self.index_map):
+            if m is not None:
+                m.close()
+        self.data_map = self.index_map = None
+
+    def _index_entry(self, generation):
+        return self.INDEX_RECORD.unpack_from(self._maps()[1], generation * self.INDEX_RECORD.size)
+
+    def _record(self, generation):
+        offset, length = self._index_entry(generation)
+        return self._maps()[0][offset:offset + length]
+
+    def frame(self, generation):
+        """Rebuild the board as it was at the given recorded generation."""
+        if not 0 <= generation < self.count:
+            raise IndexError(f"generation {generation} not recorded")
+        key = generation - generation % self.keyframe_interval
+        bits = np.frombuffer(self._record(key), dtype=np.uint8).copy()
+        for g in range(key + 1, generation + 1):
+            bits ^= np.frombuffer(zlib.decompress(self._record(g)), dtype=np.uint8)
+        return np.unpackbits(bits, count=self.shape[0] * self.shape[1]).reshape(self.shape)
+
+    def truncate(self, count):
+        """Drop every generation from count onwards."""
+        if count >= self.count:
+            return
+        if count:
+            offset = self._index_entry(count)[0]
+            self.last = np.packbits(self.frame(count - 1))
+        else:
+            offset, self.last = 0, None
+        self._unmap()
+        self.data.truncate(offset)
+        self.index.truncate(count * self.INDEX_RECORD.size)
+        self.count = count
+
+    def close(self):
+        self._unmap()
+        self.data.close()
+        self.index.close()
+        if self.temporary:
+            os.remove(self.path)
+            os.remove(self.path + ".idx")
+
+detector = CycleDetector()
+# Hashing every generation costs O(area), which would undo the Tiled engine's
+# savings on settled boards, so detection is switched on with C.
+detect_cycles = False
+# Recording packs, XORs and compresses the whole board every generation, so
+# it is switched on with H as well.
+record_history = False
+history = None
+history_position = None
+
+def update_caption():
+    caption = f"Conway's Game of Life ({current_engine})"
+    if current_engine == "HashLife":
+        caption += (f" - 2^{hashlife_exponent} gens/step, generation {universe.generation},"
+                    f" population {universe.population}, view ({view_row}, {view_col})")
+    elif detector.period is not None:
+        caption += f" - cycle of period {detector.period} since generation {detector.start}"
+    elif detect_cycles:
+        caption += " - watching for cycles"
+    if history_position is not None:
+        caption += f" - rewound to generation {history_position} of {len(history) - 1}"
+    elif record_history:
+        caption += " - recording history"
+    pygame.display.set_caption(caption)
+
+def engine_board():
+    """The current engine's board, reloaded from grid if grid changed since."""
+    global board_synced
+    board = boards.get(current_engine)
+    if board is None or board.shape != grid.shape:
+        close_board(board)
+        board = boards[current_engine] = board_engines[current_engine](grid)
+    elif board_synced != current_engine:
+        board.load(grid)
+    board_synced = current_engine
+    return board
+
+def close_board(board):
+    if isinstance(board, ParallelLife):
+        board.close()
+
+def sync_grid():
+    """Copy the board's generation into grid if the board has run ahead."""
+    global grid, grid_behind
+    if grid_behind:
+        grid = boards[board_synced].to_grid()
+        grid_behind = False
+
+def grid_edited():
+    global needs_redraw, history_position, board_synced
+    needs_redraw = True
+    board_synced = None
+    detector.reset(grid)
+    if record_history:
+        history.reset(grid)
+    history_position = None
+    update_caption()
+    if current_engine == "HashLife":
+        universe.set_window(view_row, view_col, grid)
+    elif tiled is not None and tiled.grid is grid:
+        tiled.activate_all()
+
+def step_engine(steps=1):
+    """Advance the active engine steps times and return how many generations that covered."""
+    global grid_behind, needs_redraw
+    if current_engine == "HashLife":
+        for _ in range(steps):
+            universe.step(hashlife_exponent)
+        return steps << hashlife_exponent
+    if current_engine in board_engines and not (detect_cycles or record_history):
+        # Nothing needs the generations in between, so the board runs them
+        # back to back and grid catches up when it is drawn.
+        engine_board().step(steps)
+        grid_behind = needs_redraw = True
+        return steps
+    for _ in range(steps):
+        step_grid()
+    return steps
+
+def step_grid():
+    """Advance grid by one generation, feeding the cycle detector and the history."""
+    global grid, needs_redraw, board_synced
+    if detector.period is not None:
+        grid = detector.replay()
+        board_synced = None
+        if record_history:
+            history.append(grid)
+        needs_redraw = True
+        return
+    if current_engine == "Tiled":
+        update_tiled(grid)
+        dirty_tiles.update(tiled.changed)
+    elif current_engine in board_engines:
+        board = engine_board()
+        board.step()
+        grid = board.to_grid()
+        needs_redraw = True
+    else:
+        grid = engines[current_engine](grid)
+        needs_redraw = True
+    if detect_cycles and detector.observe(grid):
+        update_caption()
+    if record_history:
+        history.append(grid)
+
+dirty_tiles = set()
+needs_redraw = True
+# Events that can change the board, the layout or the buttons. Anything else,
+# mouse motion in particular, leaves the picture alone.
+REDRAW_EVENTS = (pygame.VIDEORESIZE, pygame.VIDEOEXPOSE, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN)
+
+BENCHMARK_SIZES = [64, 256, 1024, 4096, 8192]
+BENCHMARK_BOARDS = {
+    "sparse": {"density": 0.02},
+    "dense": {"density": 0.35},
+    "gun": {"pattern": "Gosper Gun"},
+}
+
+def make_board(size, density=0.3, pattern=None, seed=0):
+    """Square board holding a library pattern at its centre, or a random soup."""
+    board = np.zeros((size, size), dtype=np.uint8)
+    if pattern is not None:
+        mask = load_pattern(pattern)
+        stamp(board, mask, max(0, (size - mask.shape[0]) // 2), max(0, (size - mask.shape[1]) // 2))
+    else:
+        rng = np.random.default_rng(seed)
+        for r in range(0, size, 1024):
+            block = board[r:r + 1024]
+            block[:] = rng.random(block.shape, dtype=np.float32) < density
+    return board
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+def run_headless(engine="NumPy", size=256, generations=100, density=0.3, pattern=None,
+                 seed=0, workers=None, detect_cycles=False):
+    """Run one engine without a window and return timing and population figures."""
+    board = make_board(size, density, pattern, seed)
+    cycles = CycleDetector() if detect_cycles and engine in ("NumPy", "Tiled") else None
+    if cycles is not None:
+        cycles.reset(board)
+
+    # Board conversion and worker start-up are kept out of the timed region.
+    if engine == "HashLife":
+        universe = HashLifeUniverse.from_grid(board)
+        start = time.perf_counter()
+        for bit in range(generations.bit_length()):
+            if generations >> bit & 1:
+                universe.step(bit)
+        elapsed = time.perf_counter() - start
+        population = universe.population
+    elif engine == "Bit-packed":
+        packed = PackedLife.from_grid(board)
+        start = time.perf_counter()
+        packed.step(generations)
+        elapsed = time.perf_counter() - start
+        population = int(packed.to_grid().sum())
+    elif engine == "Parallel":
+        with ParallelLife(board, workers) as strips:
+            start = time.perf_counter()
+            strips.step(generations)
+            elapsed = time.perf_counter() - start
+            population = int(strips.to_grid().sum())
+    else:
+        tiles = TiledLife(board) if engine == "Tiled" else None
+        start = time.perf_counter()
+        for _ in range(generations):
+            if tiles is not None:
+                tiles.step()
             else:
-                col = x // cell_w
-                row = (y - button_height) // cell_h
-                if selected_preset in presets and presets[selected_preset]:
-                    presets[selected_preset](grid, row, col)
+                board = update(board)
+            if cycles is not None and cycles.observe(board):
+                cycles.generation = generations - 1
+                board = cycles.replay()
+                break
+        elapsed = time.perf_counter() - start
+        population = int(board.sum())
+
+    result = {
+        "engine": engine,
+        # HashLife runs on an unbounded plane, so patterns that reach the
+        # edge of the board end with a different population than on a torus.
+        "topology": "unbounded" if engine == "HashLife" else "torus",
+        "size": size,
+        "board": pattern or f"soup {density:g}",
+        "generations": generations,
+        "seconds": round(elapsed, 6),
+        "generations_per_sec": round(generations / elapsed, 2) if elapsed else None,
+        "cells_per_sec": round(generations * size * size / elapsed) if elapsed else None,
+        "peak_memory_mb": peak_memory_mb(),
+        "final_population": population,
+    }
+    if cycles is not None:
+        result["cycle"] = {"period": cycles.period, "start": cycles.start} if cycles.period else None
+    return result
+
+def run_benchmark(engines_to_run, sizes, generations, seed=0):
+    """Run every engine/size/board combination in its own process and yield the results."""
+    for size in sizes:
+        for board_name, board in BENCHMARK_BOARDS.items():
+            for engine in engines_to_run:
+                cmd = [sys.executable, os.path.abspath(__file__), "--headless",
+                       "--engine", engine, "--size", str(size),
+                       "--generations", str(generations), "--seed", str(seed)]
+                if "pattern" in board:
+                    cmd += ["--pattern", board["pattern"]]
                 else:
-                    grid[row][col] = 1 - grid[row][col]
+                    cmd += ["--density", str(board["density"])]
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    yield {"engine": engine, "size": size, "board": board_name, "error": proc.stderr.strip()}
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                result["board"] = board_name
+                yield result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Conway's Game of Life")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window and print the result as JSON")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="run the benchmark matrix headless, one JSON line per run")
+    parser.add_argument("--engine", default="NumPy", choices=list(engines))
+    parser.add_argument("--size", type=int,
+                        help=f"board side length in cells (default 256 headless, {ROWS} in the window)")
+    parser.add_argument("--generations", type=int, help="generations to run headless (default 100)")
+    parser.add_argument("--density", type=float,
+                        help="live-cell density of the random soup (default 0.3 headless; "
+                             "the window starts empty unless this or --pattern is given)")
+    parser.add_argument("--pattern", choices=list(pattern_index()),
+                        help="place a library pattern at the centre instead of a random soup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="worker processes for the Parallel engine")
+    parser.add_argument("--detect-cycles", action="store_true",
+                        help="stop computing once the board cycles (NumPy and Tiled engines)")
+    parser.add_argument("--engines", nargs="+", choices=list(engines),
+                        help="engines to include in --benchmark (default NumPy Bit-packed)")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help="board sizes to include in --benchmark")
+    args = parser.parse_args(argv)
+
+    if not (args.headless or args.benchmark):
+        # The remaining options also set up the window's board.
+        headless_only = [flag for flag, value in (("--generations", args.generations),
+                                                  ("--engines", args.engines),
+                                                  ("--sizes", args.sizes)) if value is not None]
+        if headless_only:
+            parser.error(f"{', '.join(headless_only)} only apply with --headless or --benchmark")
+        return args
+    if args.size is None:
+        args.size = 256
+    if args.generations is None:
+        args.generations = 100
+    if args.density is None:
+        args.density = 0.3
+    if args.engines is None:
+        args.engines = ["NumPy", "Bit-packed"]
+    if args.sizes is None:
+        args.sizes = BENCHMARK_SIZES
+    return args
+
+def scrub(target):
+    """Show a recorded generation, pausing the simulation while rewound."""
+    global grid, running_sim, history_position, needs_redraw, board_synced
+    history_position = max(0, min(target, len(history) - 1))
+    grid = history.frame(history_position)
+    board_synced = None
+    running_sim = False
+    needs_redraw = True
+    update_caption()
+
+def main(args=None):
+    global screen, screen_width, screen_height, grid, running_sim, selected_preset
+    global current_framerate_index, current_generation_rate_index, measured_rate, needs_redraw
+    global current_engine, universe, view_row, view_col, hashlife_exponent
+    global history, history_position, detect_cycles, record_history, board_synced
+    global ROWS, COLS, parallel_workers
+
+    if args is not None:
+        if args.size is not None:
+            ROWS = COLS = args.size
+        if args.pattern is not None or args.density is not None:
+            density = 0.3 if args.density is None else args.density
+            grid = make_board(ROWS, density, args.pattern, args.seed)
+        else:
+            grid = np.zeros((ROWS, COLS), dtype=np.uint8)
+        current_engine = args.engine
+        if current_engine == "HashLife":
+            universe = HashLifeUniverse.from_grid(grid)
+        detect_cycles = args.detect_cycles
+        parallel_workers = args.workers
+
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
+    clock = pygame.time.Clock()
+
+    detector.reset(grid)
+    history = HistoryRecorder(grid.shape)
+    update_caption()
+    needs_redraw = True
+    gen_accumulator = 0.0
+    generations_counted = 0
+    rate_window_start = time.perf_counter()
+    running = True
+    while running:
+        dt = clock.tick(framerates[current_framerate_index]) / 1000
+
+        for event in pygame.event.get():
+            if event.type in REDRAW_EVENTS:
+                needs_redraw = True
+            if event.type == pygame.QUIT:
+                running = False
 
-    if running_sim:
-        grid = update(grid)
+            elif event.type == pygame.VIDEORESIZE and not fullscreen:
+                screen_width, screen_height = screen.get_size()
 
-    draw(screen, grid)
+            elif event.type == pygame.KEYDOWN:
+                scrubbable = record_history and current_engine != "HashLife"
+                if event.key == pygame.K_f:
+                    toggle_fullscreen()
+                elif event.key == pygame.K_h:
+                    record_history = not record_history
+                    if record_history:
+                        history.reset(grid)
+                    else:
+                        history.truncate(0)
+                        history_position = None
+                    update_caption()
+                elif scrubbable and event.key in (pygame.K_COMMA, pygame.K_PERIOD):
+                    position = len(history) - 1 if history_position is None else history_position
+                    step = 10 if event.mod & pygame.KMOD_SHIFT else 1
+                    scrub(position + (step if event.key == pygame.K_PERIOD else -step))
+                elif scrubbable and event.key == pygame.K_HOME:
+                    scrub(0)
+                elif scrubbable and event.key == pygame.K_END:
+                    scrub(len(history) - 1)
+                elif event.key == pygame.K_c:
+                    detect_cycles = not detect_cycles
+                    detector.reset(grid)
+                    update_caption()
+                elif event.key == pygame.K_e:
+                    names = list(engines)
+                    current_engine = names[(names.index(current_engine) + 1) % len(names)]
+                    board_synced = None
+                    if current_engine == "HashLife":
+                        view_row, view_col = 0, 0
+                        universe = HashLifeUniverse.from_grid(grid)
+                    detector.reset(grid)
+                    update_caption()
+                elif current_engine == "HashLife" and event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                    hashlife_exponent += 1 if event.key == pygame.K_RIGHTBRACKET else -1
+                    hashlife_exponent = max(0, min(hashlife_exponent, 30))
+                    update_caption()
+                elif current_engine == "HashLife" and event.key in (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT):
+                    step_r, step_c = ROWS // 4, COLS // 4
+                    view_row += {pygame.K_UP: -step_r, pygame.K_DOWN: step_r}.get(event.key, 0)
+                    view_col += {pygame.K_LEFT: -step_c, pygame.K_RIGHT: step_c}.get(event.key, 0)
+                    grid = universe.window(view_row, view_col, ROWS, COLS)
+                    update_caption()
 
-pygame.quit()
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                x, y = pygame.mouse.get_pos()
+
+                if y < button_height:
+                    btn_name = button_at(x)
+                    if btn_name == "Start/Stop":
+                        running_sim = not running_sim
+                        if running_sim and history_position is not None:
+                            # Resuming from the past drops the generations after it.
+                            history.truncate(history_position + 1)
+                            detector.reset(grid)
+                            history_position = None
+                            update_caption()
+                    elif btn_name == "Reset":
+                        grid = np.zeros((ROWS, COLS), dtype=np.uint8)
+                        board_synced = None
+                        if current_engine == "HashLife":
+                            view_row, view_col = 0, 0
+                            universe = HashLifeUniverse.from_grid(grid)
+                        detector.reset(grid)
+                        if record_history:
+                            history.reset(grid)
+                        history_position = None
+                        update_caption()
+                        running_sim = False
+                        selected_preset = None 
+                    elif btn_name == "Framerate":
+                        current_framerate_index = (current_framerate_index + 1) % len(framerates)
+                    elif btn_name == "Gen/s":
+                        current_generation_rate_index = (current_generation_rate_index + 1) % len(generation_rates)
+                        gen_accumulator = 0.0
+                    else:
+                        selected_preset = btn_name
+
+                elif get_layout().cell_at(x, y):
+                    row, col = get_layout().cell_at(x, y)
+                    if selected_preset in presets and presets[selected_preset]:
+                        presets[selected_preset](grid, row, col)
+                    else:
+                        grid[row][col] = 1 - grid[row][col]
+                    grid_edited()
+
+        if running_sim:
+            rate = generation_rates[current_generation_rate_index]
+            if rate is None:
+                deadline = time.perf_counter() + 1 / framerates[current_framerate_index]
+                generations_counted += step_engine()
+                while time.perf_counter() < deadline:
+                    generations_counted += step_engine()
+            else:
+                # Fixed timestep: bank elapsed time as generations owed, at most
+                # one second's worth so a slow engine cannot fall behind forever.
+                gen_accumulator = min(gen_accumulator + dt * rate, rate)
+                owed = int(gen_accumulator)
+                if owed:
+                    generations_counted += step_engine(owed)
+                    gen_accumulator -= owed
+            if current_engine == "HashLife":
+                grid = universe.window(view_row, view_col, ROWS, COLS)
+                update_caption()
+                needs_redraw = True
+
+        now = time.perf_counter()
+        if now - rate_window_start >= 0.5:
+            measured_rate = generations_counted / (now - rate_window_start)
+            generations_counted = 0
+            rate_window_start = now
+
+        sync_grid()
+        if needs_redraw:
+            draw(screen, grid)
+            needs_redraw = False
+        elif dirty_tiles or button_bar_state() != button_bar_key:
+            draw_tiles(screen, grid, dirty_tiles)
+        dirty_tiles.clear()
+
+    for board in boards.values():
+        close_board(board)
+    history.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark:
+        for result in run_benchmark(args.engines, args.sizes, args.generations, args.seed):
+            print(json.dumps(result), flush=True)
+    elif args.headless:
+        print(json.dumps(run_headless(args.engine, args.size, args.generations, args.density,
+                                      args.pattern, args.seed, args.workers, args.detect_cycles)))
+    else:
+        main(args)
\ No newline at end of file